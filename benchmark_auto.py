@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Auto Brightness Trace
+Drives AutoBrightness from a fake IIO light sensor through a scripted day:
+steady light, sensor noise, manual changes and real light changes, on a
+virtual clock. Checks that noise never moves the backlight, that a manual
+change holds until the light itself moves by the hysteresis, and that the
+steady room costs about one sample a minute. Runs headless with no GTK.
+"""
+
+import argparse
+import heapq
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmark_backends import current_commit
+from brightness_auto import AmbientLightSensor, AutoBrightness
+from brightness_core import DEFAULT_CONFIG
+
+# (seconds, event, value): "lux" sets the sensor, "manual" is a user change
+TRACE = [
+    (0, "lux", 200),
+    (120, "lux", 215),        # noise: well inside the hysteresis
+    (300, "manual", 30),      # user dims a bright room
+    (600, "lux", 190),        # noise again: must not undo the manual change
+    (900, "lux", 20),         # lights off: a real change, auto takes over
+    (1500, "manual", 70),     # user brightens a dark room
+    (1800, "lux", 22),
+    (2400, "lux", 800),       # curtains open
+    (3000, "lux", 800),
+]
+# Brightness that must be showing before the next event: a level, "hold" for
+# unchanged by the event, or "auto" for within the hysteresis of the lux target
+EXPECTED = {0: "auto", 120: "hold", 300: 30, 600: 30, 900: "auto", 1500: 70, 1800: 70,
+            2400: "auto", 3000: "auto"}
+
+class VirtualTimers:
+    """scheduler/cancel pair for AutoBrightness on a virtual clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._timers = []
+        self._next_id = 0
+        self._removed = set()
+
+    def schedule(self, interval_ms, callback):
+        self._next_id += 1
+        heapq.heappush(self._timers, (self.now + interval_ms / 1000, self._next_id, callback))
+        return self._next_id
+
+    def cancel(self, source_id):
+        self._removed.add(source_id)
+
+    def run_until(self, when):
+        """Fire every timer due up to when"""
+        while self._timers and self._timers[0][0] <= when:
+            due, source_id, callback = heapq.heappop(self._timers)
+            if source_id in self._removed:
+                continue
+            self.now = due
+            callback()
+        self.now = when
+
+def make_fake_sensor(root, lux):
+    """Create a fake /sys/bus/iio/devices/iio:device0 with in_illuminance_input"""
+    path = Path(root) / "iio:device0"
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "in_illuminance_input").write_text(f"{lux}\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a scripted light trace through AutoBrightness")
+    parser.add_argument("--tail", type=float, default=600, help="seconds to run after the last event")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-auto-"))
+    sensor_path = make_fake_sensor(workdir, TRACE[0][2])
+    config = dict(DEFAULT_CONFIG)
+    timers = VirtualTimers()
+    brightness = [None]
+    applies = []
+
+    def apply(value):
+        brightness[0] = value
+        applies.append((timers.now, value))
+
+    sensor = AmbientLightSensor(sensor_path)
+    auto = AutoBrightness(sensor, config, apply, scheduler=timers.schedule, cancel=timers.cancel)
+    failures = []
+    steps = []
+    try:
+        auto.start()
+        ends = [t for t, _, _ in TRACE[1:]] + [TRACE[-1][0] + args.tail]
+        for (t, event, value), end in zip(TRACE, ends):
+            timers.run_until(t)
+            if event == "lux":
+                (sensor_path / "in_illuminance_input").write_text(f"{value}\n")
+            else:
+                brightness[0] = value
+                auto.note_manual(value)
+            samples, before = auto.samples, brightness[0]
+            timers.run_until(end)
+            steps.append({"t_s": t, "event": event, "value": value,
+                          "brightness": brightness[0], "samples": auto.samples - samples})
+            want = EXPECTED[t]
+            if want == "hold":
+                ok, want = brightness[0] == before, before
+            elif want == "auto":
+                want = auto.target_for(value)
+                ok = abs(brightness[0] - want) < config['als_hysteresis']
+            else:
+                ok = brightness[0] == want
+            if not ok:
+                failures.append(f"after {event} {value} at {t} s: brightness {brightness[0]}, expected {want}")
+        steady = steps[-1]["samples"] * 60 / args.tail
+        if steady > 2:
+            failures.append(f"{steady:.1f} samples a minute in steady light")
+    finally:
+        auto.stop()
+        sensor.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": current_commit(),
+        "steps": steps,
+        "applies": len(applies),
+        "samples": auto.samples,
+        "steady_samples_per_minute": round(steady, 2),
+        "failures": failures,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'t s':>6} {'event':7} {'value':>6} {'brightness':>10} {'samples':>8}")
+        for step in steps:
+            print(f"{step['t_s']:6} {step['event']:7} {step['value']:6} {str(step['brightness']):>10}"
+                  f" {step['samples']:8}")
+        print(f"{len(applies)} applies over {auto.samples} samples,"
+              f" {report['steady_samples_per_minute']} samples/min in steady light")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Backend Latency Benchmark
+Drives BrightnessController against every backend and reports latency
+percentiles and throughput for set, get and mixed workloads. Runs headless
+with no GTK: fake backlight trees, a fake brightnessctl/sudo pair and the
+helper daemon in test mode are created in a temporary directory.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from brightness_core import (BrightnessController, HelperBackend, SubprocessBackend,
+                             SysfsBackend, DEFAULT_DEVICE)
+from brightness_ipc import CommandServer, send_command
+
+HELPER = Path(__file__).parent / "brightness_helper.py"
+FAKE_MAX = 496
+
+FAKE_BRIGHTNESSCTL = """#!/bin/sh
+# Fake brightnessctl: --device=NAME get|max|set VALUE against $FAKE_SYSFS_ROOT
+device="${1#--device=}"
+dir="$FAKE_SYSFS_ROOT/$device"
+case "$2" in
+    get) cat "$dir/brightness" ;;
+    max) cat "$dir/max_brightness" ;;
+    set) echo "$3" > "$dir/brightness" ;;
+    *) exit 1 ;;
+esac
+"""
+
+FAKE_SUDO = """#!/bin/sh
+# Fake sudo: run the command as the current user
+exec "$@"
+"""
+
+def make_fake_backlight(root, device=DEFAULT_DEVICE, max_brightness=FAKE_MAX):
+    """Create a fake /sys/class/backlight/<device> directory"""
+    path = Path(root) / device
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "max_brightness").write_text(f"{max_brightness}\n")
+    (path / "brightness").write_text(f"{max_brightness // 2}\n")
+    (path / "actual_brightness").write_text(f"{max_brightness // 2}\n")
+    (path / "type").write_text("raw\n")
+    return path
+
+def make_fake_binaries(bin_dir):
+    """Write fake brightnessctl and sudo scripts into bin_dir"""
+    bin_dir = Path(bin_dir)
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, content in (("brightnessctl", FAKE_BRIGHTNESSCTL), ("sudo", FAKE_SUDO)):
+        script = bin_dir / name
+        script.write_text(content)
+        script.chmod(0o755)
+    return bin_dir
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+def run_workload(controller, workload, iterations):
+    """Time one controller workload and return its latency/throughput summary"""
+    def operation(i):
+        if workload == "set" or (workload == "mixed" and i % 2 == 0):
+            return controller.set_brightness(i % 100 + 1)
+        return controller.get_current_brightness() is not None
+    return time_operations(operation, iterations)
+
+def run_cli_roundtrip(workdir, iterations):
+    """Time CLI command round trips against a local stand-in tray server"""
+    state = {"value": 50}
+
+    def handler(command, args):
+        if command == "SET":
+            state["value"] = int(args[0])
+        return f"OK {state['value']}"
+
+    server = CommandServer(handler, path=str(workdir / "cli.sock"))
+    server.start()
+    stop = threading.Event()
+
+    def serve_until_stopped():
+        while not stop.is_set():
+            server.serve(0.05)
+    thread = threading.Thread(target=serve_until_stopped, daemon=True)
+    thread.start()
+    try:
+        def operation(i):
+            line = "GET" if i % 2 else f"SET {i % 100 + 1}"
+            return send_command(line, server.path) is not None
+        return time_operations(operation, iterations)
+    finally:
+        stop.set()
+        thread.join()
+        server.close()
+
+def time_operations(operation, iterations):
+    """Call operation(i) iterations times and summarize latency and throughput"""
+    samples = []
+    failures = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        ok = operation(i)
+        samples.append(time.perf_counter() - t0)
+        failures += not ok
+    elapsed = time.perf_counter() - started
+
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "failures": failures,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+        "throughput_ops": round(iterations / elapsed, 1),
+    }
+
+def start_helper(sysfs_root, socket_path):
+    """Start brightness_helper.py in test mode and wait for its socket"""
+    process = subprocess.Popen([sys.executable, str(HELPER), "--test",
+                                "--sysfs-root", str(sysfs_root), "--socket", str(socket_path)])
+    deadline = time.monotonic() + 5
+    while not os.path.exists(socket_path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("helper did not start")
+        time.sleep(0.01)
+    return process
+
+def current_commit():
+    """Return the short git commit of this checkout, or None"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, timeout=5)
+        return result.stdout.strip() or None
+    except Exception as e:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Legion Brightness backends")
+    parser.add_argument("--iterations", type=int, default=2000,
+                        help="operations per workload for in-process backends")
+    parser.add_argument("--subprocess-iterations", type=int, default=100,
+                        help="operations per workload for process-spawning backends")
+    parser.add_argument("--real", action="store_true",
+                        help="also benchmark the real sudo + brightnessctl path (changes brightness)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # tmpfs keeps the fake tree close to sysfs behaviour
+    tmp_parent = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    workdir = Path(tempfile.mkdtemp(prefix="legion-bench-", dir=tmp_parent))
+    sysfs_root = workdir / "backlight"
+    make_fake_backlight(sysfs_root)
+    bin_dir = make_fake_binaries(workdir / "bin")
+    os.environ["FAKE_SYSFS_ROOT"] = str(sysfs_root)
+
+    config = {"intel_max": FAKE_MAX, "use_pkexec": False}
+    original_path = os.environ.get("PATH", "")
+    helper_process = None
+    results = {}
+    try:
+        backends = [("sysfs", lambda: SysfsBackend(DEFAULT_DEVICE, sysfs_root), args.iterations)]
+
+        helper_process = start_helper(sysfs_root, workdir / "helper.sock")
+        backends.append(("helper", lambda: HelperBackend(DEFAULT_DEVICE, workdir / "helper.sock"),
+                         args.iterations))
+
+        def fake_subprocess():
+            os.environ["PATH"] = f"{bin_dir}{os.pathsep}{original_path}"
+            return SubprocessBackend(config)
+        backends.append(("fake-brightnessctl", fake_subprocess, args.subprocess_iterations))
+
+        if args.real and shutil.which("brightnessctl"):
+            def real_subprocess():
+                os.environ["PATH"] = original_path
+                return SubprocessBackend(config)
+            backends.append(("brightnessctl", real_subprocess, args.subprocess_iterations))
+
+        for name, factory, iterations in backends:
+            controller = BrightnessController(config, factory())
+            results[name] = {workload: run_workload(controller, workload, iterations)
+                             for workload in ("set", "get", "mixed")}
+            controller.close()
+
+        results["cli-ipc"] = {"mixed": run_cli_roundtrip(workdir, args.iterations)}
+    finally:
+        if helper_process is not None:
+            helper_process.terminate()
+            helper_process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"commit": current_commit(), "python": sys.version.split()[0], "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'backend':20} {'workload':8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'fail':>5}")
+        for name, workloads in results.items():
+            for workload, stats in workloads.items():
+                print(f"{name:20} {workload:8} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f}"
+                      f" {stats['p99_ms']:9.3f} {stats['throughput_ops']:10.1f} {stats['failures']:5}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
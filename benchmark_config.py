@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Config Reload Stress Test
+Rewrites config.json from a second thread as fast as it can (atomic
+renames, in-place rewrites, writes split in two, corrupt JSON and
+invalid values) while the main thread reloads it from inotify events the
+way the tray does. Checks that a reload never exposes an invalid value,
+that the last valid write always wins and that the config's own saves do
+not trigger a reload, then that each value in CASES is kept or ignored.
+Runs headless with no GTK.
+"""
+
+import argparse
+import json
+import os
+import select
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmark_backends import current_commit, percentile
+from brightness_core import BrightnessConfig, BrightnessSettings, DEFAULT_CONFIG, metrics
+
+KINDS = ("atomic", "in-place", "split", "corrupt", "invalid")
+
+# (key, value, kept): values a reload must keep, or ignore in favour of the previous one
+CASES = [
+    ("intel_max", 937, True),
+    ("intel_max", 496.5, False),
+    ("last_brightness", 50.5, False),
+    ("last_brightness", 1000, False),
+    ("scroll_step", True, False),
+    ("curve_gamma", 2, True),
+    ("als_min_lux", 0.5, True),
+    ("power_profiles", {"ac": {"brightness": 80, "max": 100},
+                        "battery": {"brightness": None, "max": 60}}, True),
+    ("power_profiles", {"ac": {"brightness": 150, "max": 100}}, False),
+    ("power_profiles", {"ac": {"brightness": None, "max": 0}}, False),
+    ("power_profiles", {"ac": {"brightness": None, "max": "100"}}, False),
+    ("power_profiles", {"desk": {"brightness": 50, "max": 100}}, False),
+    ("power_profiles", [], False),
+    ("schedule", [["06:30", 90], ["23:15", 20]], True),
+    ("schedule", [["25:00", 40]], False),
+    ("schedule", [["07:00", 140]], False),
+    ("schedule", [["07:00", 40.5]], False),
+    ("schedule", [["07:00"]], False),
+    ("schedule", {"07:00": 40}, False),
+    ("devices", ["intel_backlight", "nvidia_0"], True),
+    ("devices", "intel_backlight", False),
+    ("devices", [1], False),
+    ("backend_routes", {"intel_backlight": "helper"}, True),
+    ("backend_routes", {"intel_backlight": "ssh"}, False),
+    ("backend_routes", ["sysfs"], False),
+]
+INVALID = [(key, value) for key, value, kept in CASES if not kept]
+
+def rewrite(path, kind, level, pause):
+    """Write config.json one way; return the level a reader must end up with, or None"""
+    data = json.dumps(dict(DEFAULT_CONFIG, last_brightness=level,
+                           scroll_step=1 + level % 20), indent=2)
+    if kind == "atomic":
+        tmp = path.with_name(".config.json.writer")
+        tmp.write_text(data)
+        os.replace(tmp, path)
+    elif kind == "in-place":
+        path.write_text(data)
+    elif kind == "split":
+        with open(path, 'w') as f:
+            f.write(data[:len(data) // 2])
+            f.flush()
+            time.sleep(pause)
+            f.write(data[len(data) // 2:])
+    elif kind == "corrupt":
+        path.write_text(data[:len(data) // 3])
+        return None
+    else:
+        data = dict(DEFAULT_CONFIG, last_brightness=level + 1000)
+        key, value = INVALID[level % len(INVALID)]
+        data[key] = value
+        path.write_text(json.dumps(data))
+        return None
+    return level
+
+def invalid_keys(config):
+    """Known keys whose current value would not pass validation"""
+    return [key for key in DEFAULT_CONFIG if not BrightnessSettings.valid(key, config[key])]
+
+def check_cases(manager, path):
+    """Reload every entry of CASES; return a failure message per wrong outcome"""
+    failures = []
+    for key, value, kept in CASES:
+        previous = manager.config[key]
+        path.write_text(json.dumps(dict(manager.config, **{key: value})))
+        manager.reload()
+        if kept and manager.config[key] != value:
+            failures.append(f"valid {key}={json.dumps(value)} was ignored")
+        elif not kept and manager.config[key] != previous:
+            failures.append(f"invalid {key}={json.dumps(value)} was kept")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress-test config.json hot reload")
+    parser.add_argument("--writes", type=int, default=2000, help="external rewrites")
+    parser.add_argument("--pause-ms", type=float, default=0.2,
+                        help="gap inside split writes, and between rewrites")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    tmp_parent = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    workdir = Path(tempfile.mkdtemp(prefix="legion-config-", dir=tmp_parent))
+    path = workdir / "config.json"
+    manager = BrightnessConfig(path)
+    fd = manager.watch()
+    if fd is None:
+        print("inotify is not available", file=sys.stderr)
+        return 1
+
+    pause = args.pause_ms / 1000
+    written = {kind: 0 for kind in KINDS}
+    expected = [manager.config['last_brightness']]
+
+    def writer():
+        for i in range(args.writes):
+            kind = KINDS[i % len(KINDS)]
+            level = rewrite(path, kind, 1 + i * 37 % 100, pause)
+            written[kind] += 1
+            if level is not None:
+                expected[0] = level
+            time.sleep(pause)
+        # Always finish with a valid file so the final state is known
+        expected[0] = rewrite(path, "atomic", 42, pause)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    failures = []
+    samples = []
+    wakeups = 0
+    changes = 0
+    started = time.perf_counter()
+    try:
+        thread.start()
+        while thread.is_alive() or select.select([fd], [], [], 0.2)[0]:
+            if not select.select([fd], [], [], 0.05)[0]:
+                continue
+            wakeups += 1
+            t0 = time.perf_counter()
+            changes += bool(manager.handle(fd))
+            samples.append(time.perf_counter() - t0)
+            bad = invalid_keys(manager.config)
+            if bad:
+                failures.append(f"invalid after reload: {', '.join(bad)}")
+        elapsed = time.perf_counter() - started
+
+        if manager.config['last_brightness'] != expected[0]:
+            failures.append(f"ended at {manager.config['last_brightness']}, last valid write was {expected[0]}")
+
+        # Our own saves must not come back as reloads
+        reloads = manager.reloads
+        manager.config['last_brightness'] = 7
+        manager.save_config()
+        while select.select([fd], [], [], 0.2)[0]:
+            manager.handle(fd)
+        if manager.reloads != reloads or manager.config['last_brightness'] != 7:
+            failures.append("own save was reloaded")
+        failures += check_cases(manager, path)
+    finally:
+        manager.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    samples.sort()
+    rejected = metrics.outcomes.get(("config_reload", "file", "failure"), 0)
+    report = {
+        "commit": current_commit(),
+        "writes": written,
+        "elapsed_s": round(elapsed, 2),
+        "wakeups": wakeups,
+        "reloads": reloads,
+        "reloads_with_changes": changes,
+        "skipped_unchanged": metrics.events.get("config_reloads_skipped", 0),
+        "rejected_partial_or_corrupt": rejected,
+        "handle_p50_ms": round(percentile(samples, 0.50) * 1000, 3) if samples else None,
+        "handle_p95_ms": round(percentile(samples, 0.95) * 1000, 3) if samples else None,
+        "failures": failures,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        total = sum(written.values())
+        print(f"{total} external writes in {report['elapsed_s']} s "
+              f"({', '.join(f'{count} {kind}' for kind, count in written.items())})")
+        print(f"  inotify wakeups       {wakeups}")
+        print(f"  reloads               {reloads} ({changes} with changes)")
+        print(f"  skipped (unchanged)   {report['skipped_unchanged']}")
+        print(f"  rejected              {rejected}")
+        print(f"  handle p50 / p95      {report['handle_p50_ms']} / {report['handle_p95_ms']} ms")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Idle Cost Profile
+Starts the tray in-process, lets start-up settle, then leaves it alone for a
+window and reports main-loop dispatches, thread wakeups, live GLib sources,
+CPU time and RSS. Fails if the idle tray keeps any timer armed: with nothing
+to do it must not wake up on its own. Needs a display (a real session or
+Xvfb) and runs against a fake backlight with its own HOME.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_backends import current_commit
+from benchmark_soak import SourceCounter, prepare_environment, rss_kb
+
+class DispatchCounter(SourceCounter):
+    """SourceCounter that also counts dispatches and re-armed timers per callback"""
+
+    def __init__(self, glib):
+        super().__init__(glib)
+        self.kinds = {}
+        self.dispatches = {}
+        self.periodic = {}
+
+    def _track(self, add, callback, args, kind="idle"):
+        source = []
+        name = f"{kind}:{getattr(callback, '__qualname__', repr(callback))}"
+
+        def fire(*fired_args):
+            self.dispatches[name] = self.dispatches.get(name, 0) + 1
+            keep = callback(*fired_args)
+            if not keep:
+                self.live.discard(source[0])
+                self.kinds.pop(source[0], None)
+            elif kind == "timeout":
+                self.periodic[name] = self.periodic.get(name, 0) + 1
+            return keep
+        source.append(add(fire, *args))
+        self.live.add(source[0])
+        self.kinds[source[0]] = kind
+        return source[0]
+
+    def timeout_add(self, interval, callback, *args):
+        return self._track(lambda fire, *a: self.glib.timeout_add(interval, fire, *a),
+                           callback, args, "timeout")
+
+    def timeout_add_seconds(self, interval, callback, *args):
+        return self._track(lambda fire, *a: self.glib.timeout_add_seconds(interval, fire, *a),
+                           callback, args, "timeout")
+
+    def io_add_watch(self, fd, priority, condition, callback, *args):
+        return self._track(lambda fire, *a: self.glib.io_add_watch(fd, priority, condition, fire, *a),
+                           callback, args, "io")
+
+    def source_remove(self, source_id):
+        self.kinds.pop(source_id, None)
+        return super().source_remove(source_id)
+
+    def snapshot(self):
+        """Live sources by kind plus a copy of the per-callback counters"""
+        live = {}
+        for kind in self.kinds.values():
+            live[kind] = live.get(kind, 0) + 1
+        return {"live": live, "dispatches": dict(self.dispatches), "periodic": dict(self.periodic)}
+
+def thread_wakeups():
+    """Context switches per thread name, read from /proc/self/task"""
+    wakeups = {}
+    for task in Path("/proc/self/task").iterdir():
+        try:
+            name = (task / "comm").read_text().strip()
+            fields = dict(line.split(":", 1) for line in (task / "status").read_text().splitlines())
+        except OSError as e:
+            continue
+        switches = int(fields["voluntary_ctxt_switches"]) + int(fields["nonvoluntary_ctxt_switches"])
+        if task.name == str(os.getpid()):
+            name = "main"
+        wakeups[name] = wakeups.get(name, 0) + switches
+    return wakeups
+
+def cpu_seconds():
+    """User plus system CPU time of this process"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def delta(after, before):
+    """Per-key difference of two counter dicts, dropping unchanged keys"""
+    changes = {key: value - before.get(key, 0) for key, value in after.items()}
+    return {key: value for key, value in changes.items() if value}
+
+def parse_setting(text):
+    """Parse a KEY=JSON config override"""
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError as e:
+        return key, value
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the idle cost of the tray process")
+    parser.add_argument("--window", type=float, default=60, help="seconds to stay idle")
+    parser.add_argument("--warmup", type=float, default=5,
+                        help="seconds for start-up work (config save, first refresh) to finish")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=JSON",
+                        help="config override, e.g. --set auto_brightness=true (repeatable)")
+    parser.add_argument("--report-only", action="store_true",
+                        help="report armed timers instead of failing on them")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-idle-"))
+    prepare_environment(workdir)
+    if args.set:
+        config_file = workdir / ".config" / "legion-brightness" / "config.json"
+        config = json.loads(config_file.read_text())
+        config.update(parse_setting(text) for text in args.set)
+        config_file.write_text(json.dumps(config))
+
+    import brightness_applet
+    from brightness_applet import Gtk, SystemTrayApplet
+    glib = brightness_applet.GLib
+    counter = DispatchCounter(glib)
+    brightness_applet.GLib = counter
+
+    def run_for(seconds):
+        # Timed with the real GLib so the profiler's own timer is not counted
+        glib.timeout_add(int(seconds * 1000), Gtk.main_quit)
+        Gtk.main()
+
+    tray = SystemTrayApplet()
+    try:
+        run_for(args.warmup)
+        before = {"sources": counter.snapshot(), "wakeups": thread_wakeups(),
+                  "cpu_s": cpu_seconds(), "rss_kb": rss_kb()}
+        started = time.monotonic()
+        run_for(args.window)
+        elapsed = time.monotonic() - started
+        after = {"sources": counter.snapshot(), "wakeups": thread_wakeups(),
+                 "cpu_s": cpu_seconds(), "rss_kb": rss_kb()}
+    finally:
+        tray.config_manager.flush()
+        tray.worker.close()
+        tray.monitor.close()
+        tray.command_server.close()
+        tray.controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    wakeups = delta(after["wakeups"], before["wakeups"])
+    timers = after["sources"]["live"].get("timeout", 0)
+    periodic = sorted(after["sources"]["periodic"])
+    failures = []
+    if timers:
+        failures.append(f"{timers} timer(s) still armed while idle")
+    if periodic:
+        failures.append(f"periodic timers: {', '.join(periodic)}")
+
+    report = {
+        "commit": current_commit(),
+        "window_s": round(elapsed, 2),
+        "overrides": dict(parse_setting(text) for text in args.set),
+        "dispatches": delta(after["sources"]["dispatches"], before["sources"]["dispatches"]),
+        "live_sources": after["sources"]["live"],
+        "wakeups": wakeups,
+        "wakeups_per_minute": round(sum(wakeups.values()) * 60 / elapsed, 1),
+        "cpu_ms": round((after["cpu_s"] - before["cpu_s"]) * 1000, 1),
+        "rss_kb": {"before": before["rss_kb"], "after": after["rss_kb"]},
+        "failures": failures,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Idle for {report['window_s']} s:")
+        print(f"  main-loop dispatches  {sum(report['dispatches'].values())}")
+        for name, count in sorted(report["dispatches"].items()):
+            print(f"    {name:40} {count}")
+        print(f"  live sources          {report['live_sources']}")
+        print(f"  thread wakeups        {sum(wakeups.values())} ({report['wakeups_per_minute']}/min)")
+        for name, count in sorted(wakeups.items()):
+            print(f"    {name:40} {count}")
+        print(f"  CPU time              {report['cpu_ms']} ms")
+        print(f"  RSS                   {before['rss_kb']} -> {after['rss_kb']} KiB")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures and not args.report_only else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Idle Dimming over D-Bus
+Starts a private `dbus-daemon --session` with a mock logind that serves
+GetSession and emits PropertiesChanged(IdleHint) for its session, and
+subscribes the tray's own idle handlers to it. Checks that going idle and
+coming back cost one backlight write each, that repeated or unrelated
+property changes write nothing, and that a manual change while dimmed
+cancels the restore. Needs PyGObject and dbus-daemon but no display.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from brightness_applet import Gio, GLib, LOGIND, SystemTrayApplet
+from brightness_core import (BrightnessConfig, BrightnessController, BrightnessWorker,
+                             DEFAULT_DEVICE)
+from benchmark_backends import current_commit, make_fake_backlight
+from benchmark_readback import CountingBackend
+
+SESSION_ID = "c7"
+SESSION_PATH = f"/org/freedesktop/login1/session/{SESSION_ID}"
+MANAGER_XML = """
+<node>
+  <interface name="org.freedesktop.login1.Manager">
+    <method name="GetSession">
+      <arg type="s" name="session_id" direction="in"/>
+      <arg type="o" name="object_path" direction="out"/>
+    </method>
+  </interface>
+</node>
+"""
+
+# Handlers taken unchanged from the tray
+TRAY_HANDLERS = ("start_idle_dim", "stop_idle_dim", "watch_idle_hint",
+                 "on_session_properties_changed", "apply_idle_brightness",
+                 "note_manual_brightness", "set_brightness", "update_indicator_label")
+
+HeadlessTray = type("HeadlessTray", (), {name: SystemTrayApplet.__dict__[name]
+                                         for name in TRAY_HANDLERS})
+
+class MockLogind(threading.Thread):
+    """org.freedesktop.login1 on a private bus, with its own main context
+
+    Runs on its own thread because the tray asks for the session with a
+    blocking call_sync from the main thread.
+    """
+
+    def __init__(self, address):
+        super().__init__(name="mock-logind", daemon=True)
+        self.address = address
+        self.requests = []
+        self.ready = threading.Event()
+        self.connection = None
+        self.loop = None
+
+    def run(self):
+        context = GLib.MainContext()
+        context.push_thread_default()
+        flags = Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | \
+            Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+        self.connection = Gio.DBusConnection.new_for_address_sync(self.address, flags, None, None)
+        manager = Gio.DBusNodeInfo.new_for_xml(MANAGER_XML).interfaces[0]
+        self.connection.register_object("/org/freedesktop/login1", manager, self.on_call, None, None)
+        self.connection.call_sync("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                                  "RequestName", GLib.Variant("(su)", (LOGIND, 4)),
+                                  GLib.VariantType("(u)"), Gio.DBusCallFlags.NONE, -1, None)
+        self.loop = GLib.MainLoop(context)
+        self.ready.set()
+        self.loop.run()
+
+    def on_call(self, connection, sender, path, interface, method, parameters, invocation):
+        self.requests.append((method, parameters.unpack()))
+        invocation.return_value(GLib.Variant("(o)", (SESSION_PATH,)))
+
+    def properties_changed(self, changed):
+        """Emit PropertiesChanged on the session with {name: GLib.Variant}"""
+        self.connection.emit_signal(None, SESSION_PATH, "org.freedesktop.DBus.Properties",
+                                    "PropertiesChanged",
+                                    GLib.Variant("(sa{sv}as)", ("org.freedesktop.login1.Session",
+                                                                changed, [])))
+        self.connection.flush_sync(None)
+
+    def set_idle(self, idle):
+        self.properties_changed({"IdleHint": GLib.Variant("b", idle)})
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.quit()
+        self.join(timeout=5)
+
+class FakeIndicator:
+    """Records the indicator label instead of drawing it"""
+
+    def __init__(self):
+        self.label = None
+
+    def set_label(self, label, guide):
+        self.label = label
+
+def start_bus():
+    """Start a private session bus; return (process, address)"""
+    process = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--nopidfile", "--print-address"],
+                               stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+def build_tray(workdir):
+    """Headless tray with the real config, controller and worker against a fake backlight"""
+    root = workdir / "backlight"
+    make_fake_backlight(root)
+    config_manager = BrightnessConfig(workdir / "config.json")
+    config = config_manager.config
+    config.update(sysfs_root=str(root), devices=[DEFAULT_DEVICE], backend="sysfs",
+                  idle_dim_enabled=True, idle_bus="session", last_brightness=70, idle_dim_level=10)
+    backend = CountingBackend(DEFAULT_DEVICE, root)
+    tray = HeadlessTray()
+    tray.config_manager = config_manager
+    tray.controller = BrightnessController(config, backend)
+    tray.worker = BrightnessWorker(tray.controller, dispatch=GLib.idle_add)
+    tray.indicator = FakeIndicator()
+    tray.window = None
+    tray.auto_brightness = tray.power_profiles = tray.schedule = tray.idle_dimmer = None
+    tray.idle_bus = tray.idle_subscription = None
+    return tray, backend
+
+def run_until(predicate, timeout):
+    """Iterate the default main context until predicate() holds; return whether it did"""
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        while context.iteration(False):
+            pass
+        if predicate():
+            return True
+        time.sleep(0.001)
+    return predicate()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check idle dimming against a mock logind on a private bus")
+    parser.add_argument("--timeout", type=float, default=2, help="seconds to wait for each step")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    if shutil.which("dbus-daemon") is None:
+        print("dbus-daemon is not installed", file=sys.stderr)
+        return 1
+    workdir = Path(tempfile.mkdtemp(prefix="legion-logind-"))
+    bus, address = start_bus()
+    # Gio reads these when it first connects to the session bus
+    os.environ["DBUS_SESSION_BUS_ADDRESS"] = address
+    os.environ["XDG_SESSION_ID"] = SESSION_ID
+    logind = MockLogind(address)
+    logind.start()
+    logind.ready.wait(5)
+
+    tray, backend = build_tray(workdir)
+    failures = []
+    steps = []
+
+    def step(name, action, writes, level=None):
+        """Run action, then check the write count and the level on the device"""
+        action()
+        done = run_until(lambda: backend.writes == writes and not tray.worker.busy, args.timeout)
+        # Leave a moment for a stray extra write to show up
+        run_until(lambda: backend.writes > writes, 0.2 if done else 0)
+        raw = tray.controller.last_raw.get(DEFAULT_DEVICE)
+        shown = tray.controller.to_percent(raw) if raw is not None else None
+        steps.append({"step": name, "writes": backend.writes, "level": shown})
+        if backend.writes != writes:
+            failures.append(f"{name}: {backend.writes} writes in total, expected {writes}")
+        elif level is not None and shown != level:
+            failures.append(f"{name}: backlight at {shown}%, expected {level}%")
+
+    try:
+        tray.start_idle_dim()
+        if tray.idle_subscription is None:
+            failures.append("could not subscribe to the mock logind")
+        elif logind.requests != [("GetSession", (SESSION_ID,))]:
+            failures.append(f"unexpected logind calls {logind.requests}")
+        else:
+            step("idle", lambda: logind.set_idle(True), 1, 10)
+            step("idle again", lambda: logind.set_idle(True), 1, 10)
+            step("unrelated property", lambda: logind.properties_changed(
+                {"LockedHint": GLib.Variant("b", True)}), 1, 10)
+            step("active", lambda: logind.set_idle(False), 2, 70)
+            step("idle", lambda: logind.set_idle(True), 3, 10)
+            step("manual change", lambda: tray.set_brightness(40), 4, 40)
+            step("active after manual", lambda: logind.set_idle(False), 4, 40)
+    finally:
+        tray.stop_idle_dim()
+        tray.worker.close()
+        tray.controller.close()
+        logind.stop()
+        bus.terminate()
+        bus.wait(timeout=5)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"commit": current_commit(), "steps": steps, "failures": failures}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in steps:
+            print(f"  {entry['step']:22} writes {entry['writes']}  level {entry['level']}%")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Change Tracking
+Changes a fake backlight tree behind the applet's back, the way hotkeys,
+other tools and resume do, and lets BrightnessMonitor pick the change up
+from its inotify watch. Checks that the cached value, the controller's
+last_raw and the on_change callback that moves the slider all follow, that
+rewriting the same value notifies nothing, and that a failed read drops the
+attribute fd from the watches until a later read succeeds, with no wakeups
+in between. Runs headless with no GTK.
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_backends import current_commit, make_fake_backlight
+from brightness_core import (BrightnessController, BrightnessMonitor, SysfsBackend,
+                             DEFAULT_CONFIG, DEFAULT_DEVICE)
+
+def set_attribute(path, text):
+    """Rewrite brightness and actual_brightness in place, as the kernel does"""
+    for name in ("brightness", "actual_brightness"):
+        with open(path / name, "r+") as f:
+            f.write(text)
+            f.truncate()
+
+def idle_wakeups(monitor, seconds):
+    """Count how often the monitor wakes up over seconds"""
+    wakeups = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        wakeups += monitor.poll(max(0, deadline - time.monotonic()))
+    return wakeups
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that external backlight changes are tracked")
+    parser.add_argument("--idle", type=float, default=0.5, help="seconds to wait for stray wakeups")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-monitor-"))
+    path = make_fake_backlight(workdir)
+    config = dict(DEFAULT_CONFIG, sysfs_root=str(workdir), devices=[DEFAULT_DEVICE], backend="sysfs")
+    controller = BrightnessController(config, SysfsBackend(DEFAULT_DEVICE, workdir))
+    changes = []
+    monitor = BrightnessMonitor(controller, DEFAULT_DEVICE, workdir, on_change=changes.append)
+    failures = []
+    steps = []
+
+    def step(name, text, notified, watched):
+        """Change the tree, handle the event and check what the applet sees"""
+        before = len(changes)
+        set_attribute(path, text)
+        fired = monitor.poll(1)
+        got = changes[before:]
+        has_fd = any(kind == "pri" for fd, kind in monitor.watches())
+        steps.append({"step": name, "fired": fired, "notified": got, "raw": monitor.raw,
+                      "last_raw": controller.last_raw.get(DEFAULT_DEVICE), "attribute_watched": has_fd})
+        if not fired:
+            failures.append(f"{name}: no inotify event")
+        if got != notified:
+            failures.append(f"{name}: on_change got {got}, expected {notified}")
+        if notified and (monitor.current != notified[-1] or
+                         controller.last_raw.get(DEFAULT_DEVICE) != monitor.raw):
+            failures.append(f"{name}: cached {monitor.current}% / last_raw "
+                            f"{controller.last_raw.get(DEFAULT_DEVICE)}, expected {notified[-1]}%")
+        if has_fd != watched:
+            failures.append(f"{name}: attribute fd {'still' if has_fd else 'not'} watched")
+
+    try:
+        monitor.start()
+        start = monitor.current
+        step("hotkey down", "124\n", [controller.to_percent(124)], True)
+        step("same value", "124\n", [], True)
+        step("hotkey up", "372\n", [controller.to_percent(372)], True)
+        step("failed read", "garbage\n", [], False)
+        stray = idle_wakeups(monitor, args.idle)
+        if stray:
+            failures.append(f"{stray} wakeups while the attribute was unreadable")
+        step("readable again", "248\n", [controller.to_percent(248)], True)
+    finally:
+        monitor.close()
+        controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"commit": current_commit(), "start": start, "steps": steps,
+              "stray_wakeups": stray, "failures": failures}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"started at {start}%")
+        for entry in steps:
+            print(f"  {entry['step']:15} raw {str(entry['raw']):>4}  notified {str(entry['notified']):6}"
+                  f"  fd watched {entry['attribute_watched']}")
+        print(f"{stray} wakeups in {args.idle:g} s after the failed read")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
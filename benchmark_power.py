@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Power Profile Switching
+Plugs and unplugs a fake /sys/class/power_supply tree and announces each
+change with a power_supply uevent, delivered through BrightnessMonitor to
+PowerProfiles the way the tray wires them. Checks that every real switch
+applies the new profile's capped brightness exactly once, that repeated or
+unrelated uevents apply nothing, and that nothing wakes up while the power
+source stays put. Runs headless with no GTK.
+"""
+
+import argparse
+import json
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_backends import current_commit, make_fake_backlight
+from brightness_auto import PowerProfiles
+from brightness_core import (BrightnessController, BrightnessMonitor, SysfsBackend,
+                             DEFAULT_CONFIG, DEFAULT_DEVICE)
+
+AC_PATH = "/devices/LNXSYSTM:00/LNXSYBUS:00/ACPI0003:00/power_supply/AC"
+BAT_PATH = "/devices/LNXSYSTM:00/LNXSYBUS:00/PNP0C0A:00/power_supply/BAT0"
+
+def make_fake_power_supply(root, online):
+    """Create a fake power_supply tree with a mains adapter and a battery"""
+    ac = Path(root) / "AC"
+    ac.mkdir(parents=True, exist_ok=True)
+    (ac / "type").write_text("Mains\n")
+    (ac / "online").write_text(f"{online}\n")
+    battery = Path(root) / "BAT0"
+    battery.mkdir(parents=True, exist_ok=True)
+    (battery / "type").write_text("Battery\n")
+    (battery / "capacity").write_text("80\n")
+    return ac
+
+def uevent(action, devpath, subsystem):
+    """A kernel uevent datagram as read from the netlink socket"""
+    return f"{action}@{devpath}\0ACTION={action}\0DEVPATH={devpath}\0SUBSYSTEM={subsystem}\0".encode()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check AC/battery profile switches driven by uevents")
+    parser.add_argument("--idle", type=float, default=2, help="seconds to wait with no power change")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-power-"))
+    ac = make_fake_power_supply(workdir / "power_supply", online=1)
+    make_fake_backlight(workdir / "backlight")
+    config = dict(DEFAULT_CONFIG, power_profiles_enabled=True, power_source=None,
+                  power_supply_root=str(workdir / "power_supply"), last_brightness=70,
+                  power_profiles={"ac": {"brightness": 80, "max": 100},
+                                  "battery": {"brightness": None, "max": 40}})
+    applies = []
+    profiles = PowerProfiles(config, applies.append)
+    controller = BrightnessController(config, SysfsBackend(DEFAULT_DEVICE, workdir / "backlight"))
+    monitor = BrightnessMonitor(controller, DEFAULT_DEVICE, workdir / "backlight",
+                                on_power_changed=profiles.update)
+    # The kernel end of the uevent socket, so the fake tree's changes can be announced
+    kernel, monitor._uevent = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    monitor._uevent.setblocking(False)
+    monitor._watches = [(monitor._uevent.fileno(), "in")]
+
+    # (step, online to set or None, uevent, applies expected from this step)
+    steps = [
+        ("unplug", 0, uevent("change", AC_PATH, "power_supply"), [40]),
+        ("battery capacity", None, uevent("change", BAT_PATH, "power_supply"), []),
+        ("unplug again", 0, uevent("change", AC_PATH, "power_supply"), []),
+        ("backlight change", None, uevent("change", "/devices/pci0000:00/backlight/intel_backlight",
+                                          "backlight"), []),
+        ("plug in", 1, uevent("change", AC_PATH, "power_supply"), [80]),
+    ]
+    failures = []
+    results = []
+    try:
+        profiles.update()
+        if applies != [80]:
+            failures.append(f"start on AC applied {applies}, expected [80]")
+        for name, online, message, expected in steps:
+            if online is not None:
+                (ac / "online").write_text(f"{online}\n")
+            before = len(applies)
+            kernel.send(message)
+            monitor.poll(1)
+            got = applies[before:]
+            results.append({"step": name, "source": profiles.source, "applied": got})
+            if got != expected:
+                failures.append(f"{name}: applied {got}, expected {expected}")
+
+        # Leave it alone: only an event may wake the monitor, and none comes
+        wakeups = 0
+        deadline = time.monotonic() + args.idle
+        while time.monotonic() < deadline:
+            wakeups += monitor.poll(max(0, deadline - time.monotonic()))
+        if wakeups:
+            failures.append(f"{wakeups} wakeups in {args.idle:g} s with no power change")
+        # PowerProfiles takes no scheduler: these fds are all the tray registers for it
+        sources = len(monitor.watches())
+    finally:
+        kernel.close()
+        monitor.close()
+        controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"commit": current_commit(), "steps": results, "switches": profiles.switches,
+              "idle_s": args.idle, "idle_wakeups": wakeups, "event_sources": sources,
+              "failures": failures}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in results:
+            print(f"  {result['step']:18} on {result['source']:8} applied {result['applied']}")
+        print(f"{profiles.switches} switches, {wakeups} wakeups in {args.idle:g} s idle"
+              f" on {sources} event fds and no timers")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
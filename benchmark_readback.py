@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Read-back Sweep
+Steps the brightness from 1% to 100% through the real transition, feeding
+each value read back from the device in as the start of the next ramp, the
+way the tray follows its own writes. Counts the hardware writes with the
+nearest-percent read-back against the old truncating one, which mapped
+reads one percent low and made every ramp start by stepping back. Runs
+headless with no GTK on a virtual clock.
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from bisect import bisect_left
+from pathlib import Path
+
+from benchmark_backends import current_commit, make_fake_backlight
+from brightness_core import (BrightnessController, BrightnessTransition, SysfsBackend,
+                             CURVE_STEPS, DEFAULT_CONFIG, DEFAULT_DEVICE)
+
+class CountingBackend(SysfsBackend):
+    """Fake-tree sysfs backend that counts writes and backwards steps"""
+
+    def __init__(self, device, root):
+        super().__init__(device, root)
+        self.writes = 0
+        self.backwards = 0
+        self.last = None
+
+    def set_raw(self, value):
+        self.writes += 1
+        if self.last is not None and value < self.last:
+            self.backwards += 1
+        self.last = value
+        return super().set_raw(value)
+
+def truncating(controller, raw):
+    """The read-back mapping before the fix: the lowest table position, truncated"""
+    curve = controller.curve_for(controller.primary)
+    return int(bisect_left(curve.table, raw) * 100 / CURVE_STEPS)
+
+def nearest(controller, raw):
+    """The read-back mapping the tray uses now"""
+    return controller.to_percent(raw)
+
+def sweep(workdir, max_raw, curve, read_back):
+    """Ramp 1..100% one percent at a time, return the write counts"""
+    root = workdir / f"{curve}-{max_raw}-{read_back.__name__}"
+    make_fake_backlight(root, max_brightness=max_raw)
+    config = dict(DEFAULT_CONFIG, sysfs_root=str(root), devices=[DEFAULT_DEVICE],
+                  backend="sysfs", curve=curve, intel_max=max_raw)
+    backend = CountingBackend(DEFAULT_DEVICE, root)
+    controller = BrightnessController(config, backend)
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+    transition = BrightnessTransition(controller, clock=lambda: now[0], sleep=sleep)
+
+    current = 1
+    controller.set_brightness(current)
+    backend.writes = backend.backwards = 0
+    mismatches = 0
+    for target in range(2, 101):
+        transition.run(current, target)
+        current = read_back(controller, controller.last_raw[DEFAULT_DEVICE])
+        # Dim curves give several percentages the same raw value; any of them will do
+        mismatches += controller.to_raw(current) != controller.to_raw(target)
+    controller.close()
+    return {"writes": backend.writes, "backwards": backend.backwards, "mismatches": mismatches}
+
+def main():
+    parser = argparse.ArgumentParser(description="Count writes over a 1-100% sweep with read-back")
+    parser.add_argument("--max", default="255,496,937,7500,96000",
+                        help="comma-separated max_brightness values to sweep")
+    parser.add_argument("--curves", default="linear,gamma,logarithmic",
+                        help="comma-separated curves to sweep")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-readback-"))
+    results = {}
+    try:
+        for curve in args.curves.split(","):
+            for max_raw in (int(value) for value in args.max.split(",")):
+                before = sweep(workdir, max_raw, curve, truncating)
+                after = sweep(workdir, max_raw, curve, nearest)
+                results[f"{curve}@{max_raw}"] = {
+                    "truncating": before,
+                    "nearest": after,
+                    "writes_removed": before["writes"] - after["writes"],
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failures = [name for name, stats in results.items() if stats["nearest"]["mismatches"]
+                or stats["nearest"]["backwards"]]
+    report = {"commit": current_commit(), "results": results,
+              "writes_removed": sum(stats["writes_removed"] for stats in results.values()),
+              "failures": failures}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'sweep':20} {'writes before':>13} {'after':>6} {'removed':>8}"
+              f" {'backwards before/after':>23} {'misread':>8}")
+        for name, stats in results.items():
+            before, after = stats["truncating"], stats["nearest"]
+            print(f"{name:20} {before['writes']:13} {after['writes']:6} {stats['writes_removed']:8}"
+                  f" {str(before['backwards']) + '/' + str(after['backwards']):>23}"
+                  f" {after['mismatches']:8}")
+        print(f"Total writes removed: {report['writes_removed']}")
+        for name in failures:
+            print(f"  {name}: read-back does not match the slider")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Restore Benchmark
+Runs brightness_restore.py as a fresh process against a fake backlight tree
+and reports its cold-start time, checks the value it wrote and that GTK was
+never imported. Fails when the median exceeds the target.
+"""
+
+import argparse
+import compileall
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_backends import FAKE_MAX, current_commit, make_fake_backlight
+from brightness_core import BrightnessCurve
+
+RESTORE = Path(__file__).parent / "brightness_restore.py"
+
+def write_config(path, root, level):
+    """Write a minimal config.json pointing at the fake tree"""
+    path.write_text(json.dumps({
+        "last_brightness": level,
+        "sysfs_root": str(root),
+        "backend": "auto",
+        "backend_routes": {},
+    }))
+
+def run_once(config_file, extra=()):
+    """Run the restore command once, return (seconds, completed process)"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *extra, str(RESTORE), "--config", str(config_file), "--quiet"],
+                            capture_output=True, text=True, timeout=30)
+    return time.perf_counter() - started, result
+
+def gtk_imported(config_file):
+    """Check the restore command's import trace for gi/GTK modules"""
+    _, result = run_once(config_file, ("-X", "importtime"))
+    modules = [line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines() if "|" in line]
+    return [name for name in modules if name == "gi" or name.startswith("gi.")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure brightness_restore.py cold-start time")
+    parser.add_argument("--runs", type=int, default=20, help="number of restores")
+    parser.add_argument("--target-ms", type=float, default=50, help="allowed median wall time")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    tmp_parent = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    workdir = Path(tempfile.mkdtemp(prefix="legion-restore-", dir=tmp_parent))
+    root = workdir / "backlight"
+    device = make_fake_backlight(root)
+    config_file = workdir / "config.json"
+
+    # Cold start still finds cached bytecode, as on an installed checkout
+    compileall.compile_file(str(Path(__file__).parent / "brightness_core.py"), quiet=1)
+
+    samples = []
+    failures = []
+    try:
+        # Python's own interpreter start-up, for comparison
+        baseline = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            baseline.append(time.perf_counter() - started)
+
+        for i in range(args.runs):
+            level = 10 + i * 7 % 90
+            write_config(config_file, root, level)
+            elapsed, result = run_once(config_file)
+            samples.append(elapsed)
+            written = int((device / "brightness").read_text())
+            if result.returncode != 0 or written != BrightnessCurve(FAKE_MAX).to_raw(level):
+                failures.append(f"run {i}: wrote {written} for {level}%: {result.stderr.strip()}")
+
+        gtk = gtk_imported(config_file)
+        if gtk:
+            failures.append(f"imported {', '.join(gtk)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    median_ms = statistics.median(samples) * 1000
+    if median_ms > args.target_ms:
+        failures.append(f"median {median_ms:.1f} ms over the {args.target_ms:g} ms target")
+
+    report = {
+        "commit": current_commit(),
+        "runs": args.runs,
+        "target_ms": args.target_ms,
+        "restore": {
+            "min_ms": round(min(samples) * 1000, 1),
+            "median_ms": round(median_ms, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+        },
+        "python_startup_median_ms": round(statistics.median(baseline) * 1000, 1),
+        "failures": failures,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        stats = report["restore"]
+        print(f"Restore over {args.runs} runs: median {stats['median_ms']:.1f} ms"
+              f"  (min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f}),"
+              f" bare interpreter {report['python_startup_median_ms']:.1f} ms")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
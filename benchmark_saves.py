@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Config Save Count
+Makes 1,000 config changes at slider rate through schedule_save() on a
+virtual clock and counts the config.json writes, which must stay at one per
+SAVE_DELAY_MS window. Then breaks the file for a while so the rename fails,
+and checks that a failed save leaves no temporary file behind, keeps the
+config dirty and is written on the next flush. Runs headless with no GTK.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmark_backends import current_commit
+from brightness_core import BrightnessConfig, SAVE_DELAY_MS
+
+class VirtualScheduler:
+    """timeout_add stand-in on a virtual clock, for one-shot callbacks"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._timers = []
+        self._next_id = 0
+
+    def __call__(self, delay_ms, callback):
+        self._next_id += 1
+        heapq.heappush(self._timers, (self.now + delay_ms / 1000, self._next_id, callback))
+        return self._next_id
+
+    def run_until(self, when):
+        """Fire every callback due up to when"""
+        while self._timers and self._timers[0][0] <= when:
+            self.now, _, callback = heapq.heappop(self._timers)
+            callback()
+        self.now = when
+
+def leftovers(directory, name):
+    """Temporary files save_config() left next to config.json"""
+    return sorted(path.name for path in directory.iterdir() if path.name.startswith(f".{name}."))
+
+def main():
+    parser = argparse.ArgumentParser(description="Count config.json writes over a burst of changes")
+    parser.add_argument("--changes", type=int, default=1000, help="config changes to make")
+    parser.add_argument("--interval-ms", type=float, default=16, help="time between changes")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-saves-"))
+    path = workdir / "config.json"
+    scheduler = VirtualScheduler()
+    manager = BrightnessConfig(path, scheduler=scheduler)
+    failures = []
+    try:
+        writes = manager.writes
+        for i in range(args.changes):
+            scheduler.run_until(i * args.interval_ms / 1000)
+            manager.config['last_brightness'] = 1 + i % 100
+            manager.schedule_save()
+        scheduler.run_until(scheduler.now + SAVE_DELAY_MS / 1000)
+        burst_writes = manager.writes - writes
+        allowed = math.ceil(args.changes * args.interval_ms / SAVE_DELAY_MS) + 1
+        if burst_writes > allowed:
+            failures.append(f"{burst_writes} writes for {args.changes} changes, allowed {allowed}")
+        if json.loads(path.read_text())['last_brightness'] != manager.config['last_brightness']:
+            failures.append("last change was not written")
+
+        # A directory in place of config.json makes the rename fail
+        path.unlink()
+        path.mkdir()
+        (path / "keep").write_text("")
+        writes = manager.writes
+        manager.config['last_brightness'] = 42
+        manager.schedule_save()
+        scheduler.run_until(scheduler.now + SAVE_DELAY_MS / 1000)
+        if manager.writes != writes or not manager.dirty:
+            failures.append("failed save was counted as written or cleared dirty")
+        left = leftovers(workdir, path.name)
+        if left:
+            failures.append(f"failed save left {', '.join(left)}")
+
+        shutil.rmtree(path)
+        manager.flush()
+        if not path.is_file() or json.loads(path.read_text())['last_brightness'] != 42:
+            failures.append("change was lost after a failed save")
+    finally:
+        manager.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": current_commit(),
+        "changes": args.changes,
+        "virtual_s": round(args.changes * args.interval_ms / 1000, 1),
+        "writes": burst_writes,
+        "writes_allowed": allowed,
+        "failures": failures,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.changes} changes over {report['virtual_s']} s: {burst_writes} writes"
+              f" (at most {allowed}, one per {SAVE_DELAY_MS} ms)")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Schedule DST Run
+Follows the brightness schedule for two days around each daylight saving
+change of a year, on a virtual clock in a real time zone. Checks that
+every point is reached at its local wall-clock time on both sides of the
+change, that ramps move one percent per write, that the schedule only
+wakes up without a change at the ends of a ramp, and that a resume from
+suspend writes the target again even when it did not change. The resume is
+also replayed through the real worker and sysfs backend against a fake
+backlight the firmware reset while suspended. Runs headless with no GTK.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_auto import VirtualTimers
+from benchmark_backends import current_commit, make_fake_backlight
+from brightness_auto import BrightnessSchedule, parse_schedule
+from brightness_core import (BrightnessController, BrightnessTransition, BrightnessWorker,
+                             SysfsBackend, DEFAULT_CONFIG, DEFAULT_DEVICE)
+
+DAY = 86400
+
+class SuspendingTimers(VirtualTimers):
+    """VirtualTimers whose pending timers stand still while suspended, like monotonic ones"""
+
+    def suspend(self, seconds):
+        self._timers = [(due + seconds, source_id, callback)
+                        for due, source_id, callback in self._timers]
+        self.now += seconds
+
+def dst_changes(year):
+    """Local midnights of the days on which tm_isdst flips during year"""
+    days = []
+    day = time.mktime((year, 1, 1, 0, 0, 0, 0, 0, -1))
+    while time.localtime(day).tm_year == year:
+        following = time.mktime(time.localtime(day)[:2] + (time.localtime(day).tm_mday + 1,
+                                                          0, 0, 0, 0, 0, -1))
+        if time.localtime(day).tm_isdst != time.localtime(following).tm_isdst:
+            days.append(day)
+        day = following
+    return days
+
+def local_time(day, clock, offset=0):
+    """Epoch time of "HH:MM" on the local day containing day, offset days later"""
+    hours, minutes = (int(part) for part in clock.split(":"))
+    date = time.localtime(day)
+    return time.mktime((date.tm_year, date.tm_mon, date.tm_mday + offset, hours, minutes, 0, 0, 0, -1))
+
+def level_at(applies, when):
+    """Brightness showing at when, from [(time, value)] applies"""
+    level = None
+    for at, value in applies:
+        if at > when:
+            break
+        level = value
+    return level
+
+def run(change_day, config, suspend_at, suspend_hours):
+    """Follow the schedule from the day before change_day to the day after it"""
+    start = local_time(change_day, "00:00", -1)
+    end = local_time(change_day, "00:00", 1)
+    timers = SuspendingTimers()
+    timers.now = start
+    applies = []
+    schedule = BrightnessSchedule(config, lambda value: applies.append((timers.now, value)),
+                                  scheduler=timers.schedule, cancel=timers.cancel,
+                                  clock=lambda: timers.now)
+    failures = []
+    schedule.start()
+
+    # Suspend on the first day, in a stretch where the target stays put
+    suspended = local_time(start, suspend_at)
+    timers.run_until(suspended)
+    timers.suspend(suspend_hours * 3600)
+    resumed = timers.now
+    before = len(applies)
+    schedule.resync()
+    if len(applies) == before:
+        failures.append(f"resume at {time.strftime('%H:%M', time.localtime(resumed))}"
+                        f" did not write the target again")
+    timers.run_until(end)
+    schedule.stop()
+
+    points = parse_schedule(config['schedule'])
+    for offset in (0, 1):
+        for seconds, value in points:
+            clock = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+            at = local_time(start, clock, offset)
+            if start < at < end and level_at(applies, at + 1) != value:
+                failures.append(f"{time.strftime('%Y-%m-%d %H:%M %Z', time.localtime(at))}:"
+                                f" showing {level_at(applies, at + 1)}%, scheduled {value}%")
+    steps = [abs(b[1] - a[1]) for a, b in zip(applies, applies[1:])
+             if not (a[0] <= resumed <= b[0])]
+    if any(step != 1 for step in steps):
+        failures.append(f"ramp steps of {sorted(set(steps))}%, expected 1%")
+    changed = sum(1 for a, b in zip(applies, applies[1:]) if a[1] != b[1])
+    idle = schedule.wakeups - changed
+    # Each point may cost a wakeup at the start and at the end of its ramp, once a day
+    if idle > 2 * len(points) * round((end - start) / DAY):
+        failures.append(f"{idle} wakeups changed nothing")
+    return {
+        "day": time.strftime("%Y-%m-%d", time.localtime(change_day)),
+        "change": f"{time.strftime('%Z', time.localtime(start))} -> {time.strftime('%Z', time.localtime(end))}",
+        "hours": round((end - start) / 3600, 1),
+        "writes": len(applies),
+        "wakeups": schedule.wakeups,
+        "idle_wakeups": idle,
+        "failures": failures,
+    }
+
+def resume_on_hardware(level=40, reset_raw=496):
+    """Resume the way the tray does, against a fake backlight reset while suspended
+
+    Returns (raw before the suspend, raw after the resume, raw expected).
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="legion-resume-"))
+    path = make_fake_backlight(workdir, max_brightness=reset_raw)
+    config = dict(DEFAULT_CONFIG, sysfs_root=str(workdir), devices=[DEFAULT_DEVICE],
+                  backend="sysfs", intel_max=reset_raw, schedule=[["00:00", level]])
+    controller = BrightnessController(config, SysfsBackend(DEFAULT_DEVICE, workdir))
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+    worker = BrightnessWorker(controller, transition=BrightnessTransition(
+        controller, clock=lambda: now[0], sleep=sleep))
+    timers = VirtualTimers()
+    schedule = BrightnessSchedule(config, worker.post, scheduler=timers.schedule,
+                                  cancel=timers.cancel, clock=time.time)
+    read = lambda: int((path / "brightness").read_text())
+    try:
+        schedule.start()
+        worker.wait_idle(5)
+        before = read()
+        # The firmware brings the panel back at full brightness
+        for name in ("brightness", "actual_brightness"):
+            (path / name).write_text(f"{reset_raw}\n")
+        # What the tray's on_clock_changed does
+        worker.invalidate()
+        schedule.resync()
+        worker.wait_idle(5)
+        return before, read(), controller.to_raw(level)
+    finally:
+        schedule.stop()
+        worker.close()
+        controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow the schedule across daylight saving changes")
+    parser.add_argument("--tz", default="Europe/Berlin", help="time zone to run in")
+    parser.add_argument("--year", type=int, default=time.localtime().tm_year)
+    parser.add_argument("--schedule", default='[["07:00", 100], ["22:00", 40], ["03:30", 20]]',
+                        help="schedule as JSON (default: the config default plus a point near the change)")
+    parser.add_argument("--ramp-minutes", type=int, default=DEFAULT_CONFIG['schedule_ramp_minutes'])
+    parser.add_argument("--suspend-at", default="12:00", help="local time to suspend on the first day")
+    parser.add_argument("--suspend-hours", type=float, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    os.environ["TZ"] = args.tz
+    time.tzset()
+    config = dict(DEFAULT_CONFIG, schedule=json.loads(args.schedule),
+                  schedule_ramp_minutes=args.ramp_minutes)
+    days = dst_changes(args.year)
+    if not days:
+        print(f"{args.tz} has no daylight saving change in {args.year}", file=sys.stderr)
+        return 1
+
+    results = [run(day, config, args.suspend_at, args.suspend_hours) for day in days]
+    failures = [f"{result['day']}: {failure}" for result in results for failure in result["failures"]]
+    before, after, expected = resume_on_hardware()
+    if before != expected or after != expected:
+        failures.append(f"backlight at raw {after} after resume (before suspend {before}), expected {expected}")
+    report = {"commit": current_commit(), "tz": args.tz, "runs": results,
+              "resume_raw": {"before": before, "after": after, "expected": expected},
+              "failures": failures}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in results:
+            print(f"{result['day']} ({result['change']}, {result['hours']} h):"
+                  f" {result['writes']} writes, {result['wakeups']} wakeups"
+                  f" ({result['idle_wakeups']} without a change)")
+        print(f"resume on a reset backlight: raw {before} -> {after} (expected {expected})")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
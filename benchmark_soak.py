@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Window Lifecycle Soak Test
+Opens and closes the control window and fires status updates thousands of
+times in one tray process, then checks that RSS, live GLib timeout/idle
+sources and toplevel windows stay flat. Needs a display (a real session or
+Xvfb). Runs against a fake backlight with its own HOME and runtime directory,
+so your config and screen are left alone.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_backends import current_commit, make_fake_backlight
+
+class SourceCounter:
+    """Wrap the GLib module to track timeout/idle sources that are still pending"""
+
+    def __init__(self, glib):
+        self.glib = glib
+        self.live = set()
+
+    def __getattr__(self, name):
+        return getattr(self.glib, name)
+
+    def _track(self, add, callback, args):
+        source = []
+
+        def fire(*fired_args):
+            keep = callback(*fired_args)
+            if not keep:
+                self.live.discard(source[0])
+            return keep
+        source.append(add(fire, *args))
+        self.live.add(source[0])
+        return source[0]
+
+    def timeout_add(self, interval, callback, *args):
+        return self._track(lambda fire, *a: self.glib.timeout_add(interval, fire, *a), callback, args)
+
+    def idle_add(self, callback, *args):
+        return self._track(self.glib.idle_add, callback, args)
+
+    def source_remove(self, source_id):
+        self.live.discard(source_id)
+        return self.glib.source_remove(source_id)
+
+def rss_kb():
+    """Resident set size of this process in KiB"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+def prepare_environment(workdir):
+    """Point HOME, the runtime dir and the config at a throwaway fake backlight"""
+    root = workdir / "backlight"
+    make_fake_backlight(root)
+    os.environ["HOME"] = str(workdir)
+    os.environ["XDG_RUNTIME_DIR"] = str(workdir)
+    config_dir = workdir / ".config" / "legion-brightness"
+    config_dir.mkdir(parents=True)
+    (config_dir / "config.json").write_text(json.dumps({
+        "sysfs_root": str(root),
+        "backend": "sysfs",
+        "iio_root": str(workdir / "iio"),
+        "transition_ms": 0,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test the window and timer lifecycle")
+    parser.add_argument("--iterations", type=int, default=5000, help="open/close cycles")
+    parser.add_argument("--warmup", type=int, default=200, help="cycles before the baseline is taken")
+    parser.add_argument("--max-rss-growth-kb", type=int, default=2048,
+                        help="allowed RSS growth after warm-up")
+    parser.add_argument("--max-source-growth", type=int, default=2,
+                        help="allowed growth in pending GLib sources after warm-up")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-soak-"))
+    prepare_environment(workdir)
+
+    import brightness_applet
+    from brightness_applet import Gtk, SystemTrayApplet
+    counter = SourceCounter(brightness_applet.GLib)
+    brightness_applet.GLib = counter
+
+    def pump():
+        while Gtk.events_pending():
+            Gtk.main_iteration_do(False)
+
+    tray = SystemTrayApplet()
+    started = time.perf_counter()
+    baseline = None
+    first_window = None
+    try:
+        for i in range(args.iterations):
+            tray.show_window(None)
+            window = tray.window
+            first_window = first_window or window
+            window.scale.set_value(1 + i % 100)
+            window.on_brightness_applied(1 + i % 100, True)
+            window.on_refresh_clicked(None)
+            window.on_close_clicked(None)
+            tray.worker.wait_idle(5)
+            pump()
+            if i + 1 == args.warmup:
+                baseline = {"rss_kb": rss_kb(), "sources": len(counter.live),
+                            "toplevels": len(Gtk.Window.list_toplevels())}
+        final = {"rss_kb": rss_kb(), "sources": len(counter.live),
+                 "toplevels": len(Gtk.Window.list_toplevels())}
+    finally:
+        tray.config_manager.flush()
+        tray.worker.close()
+        tray.monitor.close()
+        tray.command_server.close()
+        tray.controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = baseline or final
+    failures = []
+    if final["rss_kb"] - baseline["rss_kb"] > args.max_rss_growth_kb:
+        failures.append("rss")
+    if final["sources"] - baseline["sources"] > args.max_source_growth:
+        failures.append("sources")
+    if final["toplevels"] != baseline["toplevels"]:
+        failures.append("toplevels")
+    if tray.window is not first_window:
+        failures.append("window reused")
+
+    report = {
+        "commit": current_commit(),
+        "iterations": args.iterations,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "baseline": baseline,
+        "final": final,
+        "failures": failures,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.iterations} cycles in {report['elapsed_s']} s")
+        for key in ("rss_kb", "sources", "toplevels"):
+            print(f"  {key:10} {baseline[key]:>8} -> {final[key]:>8}")
+        print("PASS" if not failures else f"FAIL: {', '.join(failures)}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
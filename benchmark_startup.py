@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Startup Benchmark
+Launches the tray applet repeatedly and reports time-to-indicator,
+time-to-ready (backends started) and time-to-window-visible. Needs a display (a real session or Xvfb).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APPLET = Path(__file__).parent / "brightness_applet.py"
+
+def run_once(timeout):
+    """Start the applet once and return {stage: seconds since launch}"""
+    env = dict(os.environ, LEGION_BRIGHTNESS_STARTUP_BENCHMARK="1")
+    started = time.time()
+    result = subprocess.run([sys.executable, str(APPLET)], env=env,
+                            capture_output=True, text=True, timeout=timeout)
+    stages = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == "startup":
+            stages[parts[1]] = float(parts[2]) - started
+    if "window" not in stages or "ready" not in stages:
+        raise RuntimeError(f"applet did not report a visible window:\n{result.stderr}")
+    return stages
+
+def summarize(samples):
+    """Return min/median/max in milliseconds"""
+    return {
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Legion Brightness startup time")
+    parser.add_argument("--runs", type=int, default=10, help="number of launches")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds allowed per launch")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    runs = [run_once(args.timeout) for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "time_to_indicator": summarize([run["indicator"] for run in runs]),
+        "time_to_ready": summarize([run["ready"] for run in runs]),
+        "time_to_window_visible": summarize([run["window"] for run in runs]),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Startup over {args.runs} runs:")
+        for stage in ("time_to_indicator", "time_to_ready", "time_to_window_visible"):
+            stats = report[stage]
+            print(f"  {stage:24} median {stats['median_ms']:7.1f} ms"
+                  f"  (min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - UI Event Replay Harness
+Replays slider, scroll, preset and refresh events through the real BrightnessApplet
+and SystemTrayApplet handlers on a virtual GLib clock, against a fake
+backlight with a simulated write latency. Each run reports hardware writes,
+config saves, the time from the last input to the committed value and the
+time spent inside main-loop callbacks. Needs PyGObject to import the applet
+but no display: no widgets are created.
+"""
+
+import argparse
+import heapq
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import brightness_applet
+from brightness_applet import BrightnessApplet, SystemTrayApplet
+from brightness_core import (BrightnessConfig, BrightnessController, BrightnessMonitor,
+                             BrightnessTransition, BrightnessWorker, SysfsBackend,
+                             DEFAULT_DEVICE, PRESETS)
+from benchmark_backends import current_commit, make_fake_backlight
+
+# Handlers taken unchanged from the applet classes
+WINDOW_HANDLERS = ("create_throttle", "load_current_brightness", "read_current_brightness",
+                   "on_brightness_changed", "update_label", "on_scale_changed",
+                   "apply_brightness", "on_brightness_applied", "on_refresh_clicked",
+                   "set_status", "on_status_timeout")
+TRAY_HANDLERS = ("current_brightness", "on_brightness_changed", "set_quick_brightness",
+                 "apply_auto_brightness", "note_manual_brightness", "set_brightness",
+                 "update_indicator_label", "create_scroll_throttle", "on_scroll")
+
+HeadlessWindow = type("HeadlessWindow", (), {name: BrightnessApplet.__dict__[name]
+                                             for name in WINDOW_HANDLERS})
+HeadlessTray = type("HeadlessTray", (), {name: SystemTrayApplet.__dict__[name]
+                                         for name in TRAY_HANDLERS})
+
+class VirtualLoop:
+    """Stand-in for the GLib calls the applet makes, on a virtual clock
+
+    Time only moves when run_until() advances it to the next timer or to
+    the next wakeup of a worker thread blocked in sleep(), so runs are
+    repeatable and a ten second trace replays in milliseconds. Every
+    callback dispatched on this "main loop" is timed with the real clock.
+    """
+    PRIORITY_DEFAULT = 0
+
+    def __init__(self):
+        self.now = 0.0
+        self.stalls = []
+        self._cond = threading.Condition()
+        self._timers = []
+        self._removed = set()
+        self._idle = deque()
+        self._wakeups = []
+        self._next_id = 0
+
+    def clock(self):
+        return self.now
+
+    def get_monotonic_time(self):
+        return int(self.now * 1e6)
+
+    def timeout_add(self, interval_ms, callback, *args):
+        with self._cond:
+            self._next_id += 1
+            heapq.heappush(self._timers, (self.now + interval_ms / 1000, self._next_id,
+                                          interval_ms, callback, args))
+            return self._next_id
+
+    def source_remove(self, source_id):
+        self._removed.add(source_id)
+        return True
+
+    def idle_add(self, callback, *args):
+        with self._cond:
+            self._next_id += 1
+            self._idle.append((callback, args))
+            return self._next_id
+
+    def sleep(self, seconds):
+        """Block the calling worker thread until the virtual clock has moved on"""
+        with self._cond:
+            deadline = self.now + seconds
+            heapq.heappush(self._wakeups, deadline)
+            self._cond.wait_for(lambda: self.now >= deadline)
+
+    def dispatch(self, callback, *args):
+        """Run a main-loop callback and record how long it blocked the loop"""
+        started = time.perf_counter()
+        result = callback(*args)
+        self.stalls.append(time.perf_counter() - started)
+        return result
+
+    def _settle(self, worker):
+        # Wait until the worker thread is idle or parked in sleep()
+        deadline = time.monotonic() + 10
+        while worker.busy and not self._wakeups:
+            if time.monotonic() > deadline:
+                raise RuntimeError("brightness worker did not settle")
+            time.sleep(0.0001)
+
+    def _advance(self, when):
+        with self._cond:
+            self.now = max(self.now, when)
+            while self._wakeups and self._wakeups[0] <= self.now:
+                heapq.heappop(self._wakeups)
+            self._cond.notify_all()
+
+    def run_until(self, when, worker):
+        """Dispatch everything due up to virtual time when"""
+        while True:
+            self._settle(worker)
+            if self._idle:
+                callback, args = self._idle.popleft()
+                self.dispatch(callback, *args)
+                continue
+            while self._timers and self._timers[0][1] in self._removed:
+                heapq.heappop(self._timers)
+            candidates = [self._timers[0][0]] if self._timers else []
+            candidates += self._wakeups[:1]
+            if not candidates or min(candidates) > when:
+                self._advance(when)
+                return
+            self._advance(min(candidates))
+            if self._timers and self._timers[0][0] <= self.now:
+                due, source_id, interval_ms, callback, args = heapq.heappop(self._timers)
+                if self.dispatch(callback, *args):
+                    heapq.heappush(self._timers, (self.now + interval_ms / 1000, source_id,
+                                                  interval_ms, callback, args))
+
+class LatencyBackend(SysfsBackend):
+    """Fake-tree sysfs backend that takes latency seconds of virtual time per write"""
+    name = "fake"
+
+    def __init__(self, loop, latency, device, root):
+        super().__init__(device, root)
+        self.loop = loop
+        self.latency = latency
+        self.writes = []
+
+    def set_raw(self, value):
+        self.loop.sleep(self.latency)
+        self.writes.append((self.loop.now, value))
+        return super().set_raw(value)
+
+class FakeLabel:
+    """Records the last markup instead of drawing it"""
+
+    def __init__(self):
+        self.markup = None
+        self.updates = 0
+
+    def set_markup(self, markup):
+        self.markup = markup
+        self.updates += 1
+
+class FakeIndicator:
+    """Records the indicator label instead of drawing it"""
+
+    def __init__(self):
+        self.label = None
+
+    def set_label(self, label, guide):
+        self.label = label
+
+class FakeScale:
+    """Holds a value and emits value-changed like Gtk.Scale"""
+
+    def __init__(self, value, on_changed):
+        self.value = value
+        self.on_changed = on_changed
+
+    def get_value(self):
+        return self.value
+
+    def set_value(self, value):
+        if value != self.value:
+            self.value = value
+            self.on_changed(self)
+
+def build_applet(loop, workdir, latency, transition_ms):
+    """Wire real controller/worker objects to headless tray and window stand-ins"""
+    root = workdir / "backlight"
+    make_fake_backlight(root)
+    config_manager = BrightnessConfig(workdir / "config.json", scheduler=loop.timeout_add)
+    config = config_manager.config
+    config.update(sysfs_root=str(root), devices=[DEFAULT_DEVICE], backend="sysfs")
+    if transition_ms is not None:
+        config['transition_ms'] = transition_ms
+    backend = LatencyBackend(loop, latency, DEFAULT_DEVICE, root)
+    controller = BrightnessController(config, backend, clock=loop.clock)
+
+    tray = HeadlessTray()
+    tray.config_manager = config_manager
+    tray.controller = controller
+    tray.transition = BrightnessTransition(controller, clock=loop.clock, sleep=loop.sleep)
+    tray.worker = BrightnessWorker(controller, dispatch=loop.idle_add, transition=tray.transition)
+    tray.monitor = BrightnessMonitor(controller, DEFAULT_DEVICE, root)
+    tray.monitor.refresh()
+    tray.auto_brightness = tray.power_profiles = tray.schedule = tray.idle_dimmer = None
+    tray.indicator = FakeIndicator()
+    tray.scroll_target = None
+    tray.scroll_throttle = tray.create_scroll_throttle()
+
+    window = HeadlessWindow()
+    window.tray_applet = tray
+    window.config_manager = config_manager
+    window.controller = controller
+    window.updating = False
+    window.status_timer = None
+    window.brightness_label = FakeLabel()
+    window.status_label = FakeLabel()
+    window.scale = FakeScale(config['last_brightness'], window.on_scale_changed)
+    window.throttle = window.create_throttle()
+    tray.window = window
+    return tray, window, backend
+
+def generate_trace(name, seed=1):
+    """Return [(t_ms, event, value)] for a named synthetic trace"""
+    rng = random.Random(seed)
+    if name == "drag":
+        # One second sweep from 1% to 100% at 60 Hz
+        return [(i * 16, "scale", 1 + round(99 * i / 62)) for i in range(63)]
+    if name == "jitter":
+        # Three seconds of small back-and-forth moves at 60 Hz
+        value, events = 50, []
+        for i in range(188):
+            value = max(20, min(80, value + rng.randint(-3, 3)))
+            events.append((i * 16, "scale", value))
+        return events
+    if name == "scroll":
+        # A fast wheel spin: 40 notches up, then 10 down, 8 ms apart
+        return [(i * 8, "scroll", 1 if i < 40 else -1) for i in range(50)]
+    if name == "presets":
+        return [(i * 300, "preset", value) for i, value in enumerate(PRESETS)]
+    if name == "mixed":
+        events = generate_trace("drag")
+        events += [(1200, "refresh", None), (1500, "preset", PRESETS[3])]
+        events += [(2000 + t, "scale", 101 - value) for t, _, value in generate_trace("drag")]
+        return events
+    raise ValueError(f"unknown trace {name}")
+
+def load_trace(path):
+    """Read a recorded trace: a JSON list of {"t_ms", "event", "value"} objects"""
+    return [(entry["t_ms"], entry["event"], entry.get("value"))
+            for entry in json.loads(Path(path).read_text())]
+
+def replay(events, latency, transition_ms=None, tail_ms=5000):
+    """Replay one trace and return its report"""
+    workdir = Path(tempfile.mkdtemp(prefix="legion-ui-"))
+    loop = VirtualLoop()
+    original_glib = brightness_applet.GLib
+    brightness_applet.GLib = loop
+    try:
+        tray, window, backend = build_applet(loop, workdir, latency, transition_ms)
+        saves_before = tray.config_manager.writes
+        target = None
+        last_input = 0.0
+        for t_ms, event, value in sorted(events, key=lambda event: event[0]):
+            loop.run_until(t_ms / 1000, tray.worker)
+            if event == "scale":
+                loop.dispatch(window.scale.set_value, value)
+                target, last_input = value, loop.now
+            elif event == "scroll":
+                direction = brightness_applet.Gdk.ScrollDirection
+                loop.dispatch(tray.on_scroll, None, abs(value),
+                              direction.UP if value > 0 else direction.DOWN)
+                target, last_input = tray.scroll_target, loop.now
+            elif event == "preset":
+                loop.dispatch(tray.set_quick_brightness, None, value)
+                target, last_input = value, loop.now
+            elif event == "refresh":
+                loop.dispatch(window.on_refresh_clicked, None)
+            else:
+                raise ValueError(f"unknown event {event}")
+        loop.run_until(loop.now + tail_ms / 1000, tray.worker)
+
+        # The fake tree has no driver updating actual_brightness, so use the last write
+        last_write, final_raw = backend.writes[-1] if backend.writes else (last_input, None)
+        committed = tray.controller.to_percent(final_raw) if final_raw is not None else None
+        writes = len(backend.writes)
+        if committed is not None:
+            # Echo the write back the way the monitor does; it must not move the slider or write
+            loop.dispatch(tray.on_brightness_changed, committed)
+            loop.run_until(loop.now + tail_ms / 1000, tray.worker)
+        report = {
+            "events": len(events),
+            "hardware_writes": len(backend.writes),
+            "config_saves": tray.config_manager.writes - saves_before,
+            "settle_ms": round(max(0.0, last_write - last_input) * 1000, 1),
+            "committed": committed,
+            "target": target,
+            "reached": target is None or final_raw == tray.controller.to_raw(target),
+            "read_back": target is None or (committed == target and window.scale.value == target
+                                            and len(backend.writes) == writes),
+            "stall_total_ms": round(sum(loop.stalls) * 1000, 3),
+            "stall_max_ms": round(max(loop.stalls, default=0) * 1000, 3),
+        }
+        tray.worker.close()
+        tray.monitor.close()
+        tray.controller.close()
+        return report
+    finally:
+        brightness_applet.GLib = original_glib
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay UI event traces through the applet handlers")
+    parser.add_argument("--trace", action="append",
+                        help="recorded trace file (JSON); may be repeated")
+    parser.add_argument("--generated", default="drag,jitter,scroll,presets,mixed",
+                        help="comma-separated synthetic traces to run")
+    parser.add_argument("--latency-ms", default="0.05,1,40",
+                        help="comma-separated simulated backend write latencies")
+    parser.add_argument("--transition-ms", type=int,
+                        help="override transition_ms (default: the config default)")
+    parser.add_argument("--drag-settle-ms", type=float, default=100,
+                        help="allowed settle time of slider-only traces (drag, jitter)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    traces = {name: generate_trace(name) for name in args.generated.split(",") if name}
+    for path in args.trace or []:
+        traces[Path(path).name] = load_trace(path)
+
+    results = {}
+    failures = []
+    for name, events in traces.items():
+        for latency_ms in (float(value) for value in args.latency_ms.split(",")):
+            run = f"{name}@{latency_ms:g}ms"
+            stats = results[run] = replay(events, latency_ms / 1000, args.transition_ms)
+            if not stats['reached'] or not stats['read_back']:
+                failures.append(f"{run}: ended at {stats['committed']}%, target {stats['target']}%")
+            if all(event == "scale" for _, event, _ in events):
+                # Drags are not ramped: at most one write per slider event, done soon after the last
+                if stats['hardware_writes'] > stats['events']:
+                    failures.append(f"{run}: {stats['hardware_writes']} writes for {stats['events']} slider events")
+                if stats['settle_ms'] > args.drag_settle_ms:
+                    failures.append(f"{run}: settled in {stats['settle_ms']} ms, limit {args.drag_settle_ms:g} ms")
+
+    report = {"commit": current_commit(), "python": sys.version.split()[0], "results": results,
+              "failures": failures}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'run':22} {'events':>6} {'writes':>6} {'saves':>5} {'settle ms':>10}"
+              f" {'final':>7} {'ok':>3} {'stall ms':>9} {'max ms':>7}")
+        for name, stats in results.items():
+            print(f"{name:22} {stats['events']:6} {stats['hardware_writes']:6} {stats['config_saves']:5}"
+                  f" {stats['settle_ms']:10.1f} {str(stats['committed']) + '/' + str(stats['target']):>7}"
+                  f" {'yes' if stats['reached'] and stats['read_back'] else 'NO':>3}"
+                  f" {stats['stall_total_ms']:9.3f} {stats['stall_max_ms']:7.3f}")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Worker Responsiveness
+Drags the slider against a deliberately slow fake backend, posting a new
+value every frame through BrightnessWorker the way the window does, while
+the posting thread keeps a frame-paced loop going like the GTK main loop.
+Checks that post() never blocks that loop, that the drag collapses to about
+one write per backend latency, and that the last value is what lands on the
+device. The same drag written inline, as the applet did before the worker,
+is timed for comparison. Runs headless with no GTK.
+"""
+
+import argparse
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_backends import current_commit, make_fake_backlight
+from benchmark_readback import CountingBackend
+from brightness_core import BrightnessController, BrightnessWorker, DEFAULT_CONFIG, DEFAULT_DEVICE
+
+class SlowBackend(CountingBackend):
+    """Fake-tree sysfs backend whose writes take as long as a sudo or pkexec fork"""
+
+    def __init__(self, device, root, latency):
+        super().__init__(device, root)
+        self.latency = latency
+
+    def set_raw(self, value):
+        time.sleep(self.latency)
+        return super().set_raw(value)
+
+def drag(post, values, frame):
+    """Post one value per frame; return (longest post() call, longest frame overrun) in seconds"""
+    longest_post = longest_overrun = 0.0
+    due = time.monotonic()
+    for value in values:
+        now = time.monotonic()
+        longest_overrun = max(longest_overrun, now - due)
+        started = time.perf_counter()
+        post(value)
+        longest_post = max(longest_post, time.perf_counter() - started)
+        due += frame
+        time.sleep(max(0, due - time.monotonic()))
+    return longest_post, longest_overrun
+
+def run(workdir, latency, frames, frame, inline):
+    """Drag 1% -> 100% and back against a backend taking latency seconds per write"""
+    root = workdir / ("inline" if inline else "worker")
+    path = make_fake_backlight(root)
+    config = dict(DEFAULT_CONFIG, sysfs_root=str(root), devices=[DEFAULT_DEVICE], backend="sysfs")
+    backend = SlowBackend(DEFAULT_DEVICE, root, latency)
+    controller = BrightnessController(config, backend)
+    values = [round(1 + 99 * abs(math.sin(math.pi * i / frames))) for i in range(frames)] + [37]
+    applied = []
+    worker = None
+    try:
+        if inline:
+            post = controller.set_brightness
+        else:
+            worker = BrightnessWorker(controller)
+            post = lambda value: worker.post(value, lambda v, ok: applied.append((v, ok)), ramp=False)
+        started = time.monotonic()
+        longest_post, longest_overrun = drag(post, values, frame)
+        drag_s = time.monotonic() - started
+        if worker is not None:
+            worker.wait_idle(10)
+        landed = int((path / "brightness").read_text())
+        return {
+            "posts": len(values),
+            "drag_s": round(drag_s, 3),
+            "writes": backend.writes,
+            "coalesced": worker.dropped if worker is not None else 0,
+            "longest_post_ms": round(longest_post * 1000, 3),
+            "longest_overrun_ms": round(longest_overrun * 1000, 3),
+            "landed_raw": landed,
+            "expected_raw": controller.to_raw(values[-1]),
+            "last_callback": applied[-1] if applied else None,
+        }
+    finally:
+        if worker is not None:
+            worker.close()
+        controller.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that slow writes never block the posting loop")
+    parser.add_argument("--latency-ms", type=float, default=100, help="time each fake write takes")
+    parser.add_argument("--frames", type=int, default=60, help="slider values posted during the drag")
+    parser.add_argument("--frame-ms", type=float, default=16, help="time between posted values")
+    parser.add_argument("--max-post-ms", type=float, default=5, help="allowed longest post() call")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="legion-worker-"))
+    latency, frame = args.latency_ms / 1000, args.frame_ms / 1000
+    try:
+        worker = run(workdir, latency, args.frames, frame, inline=False)
+        inline = run(workdir, latency, args.frames, frame, inline=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failures = []
+    if worker["longest_post_ms"] > args.max_post_ms:
+        failures.append(f"post() took {worker['longest_post_ms']} ms, allowed {args.max_post_ms}")
+    if worker["longest_overrun_ms"] > args.max_post_ms + args.frame_ms:
+        failures.append(f"the posting loop fell {worker['longest_overrun_ms']} ms behind")
+    # One write in flight when the drag starts, then one per latency, then the last value
+    allowed = math.ceil(worker["drag_s"] / latency) + 2
+    if worker["writes"] > allowed:
+        failures.append(f"{worker['writes']} writes for a {worker['drag_s']} s drag, allowed {allowed}")
+    if worker["landed_raw"] != worker["expected_raw"]:
+        failures.append(f"device at raw {worker['landed_raw']}, expected {worker['expected_raw']}")
+    if worker["last_callback"] != (37, True):
+        failures.append(f"last completion callback was {worker['last_callback']}")
+
+    report = {"commit": current_commit(), "latency_ms": args.latency_ms, "worker": worker,
+              "inline": inline, "writes_allowed": allowed, "failures": failures}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.frames + 1} slider values every {args.frame_ms:g} ms, {args.latency_ms:g} ms per write")
+        print(f"{'':8} {'drag s':>7} {'writes':>7} {'longest post ms':>16} {'behind ms':>10}")
+        for name, stats in (("worker", worker), ("inline", inline)):
+            print(f"{name:8} {stats['drag_s']:7} {stats['writes']:7} {stats['longest_post_ms']:16}"
+                  f" {stats['longest_overrun_ms']:10}")
+        for failure in failures:
+            print(f"  {failure}")
+        print("PASS" if not failures else "FAIL")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,83 +4,37 @@ Lenovo Legion Brightness Control - GTK3 System Tray Applet
 Simple vertical slider interface for brightness control with quick select values before opening the full applet.
 """
 
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # CLI commands go to the running instance without importing GTK
+    from brightness_ipc import cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('AppIndicator3', '0.1')
-from gi.repository import Gtk, GLib, AppIndicator3
-import subprocess
-import json
+from gi.repository import Gtk, Gdk, Gio, GLib, AppIndicator3
 from pathlib import Path
+import os
+import signal
+import threading
+import time
+from brightness_core import (BrightnessConfig, BrightnessController, BrightnessMonitor,
+                             BrightnessTransition, BrightnessWorker, ClockWatch, PRESETS,
+                             SCROLL_INTERVAL_MS, SliderThrottle, metrics)
+from brightness_auto import (AmbientLightSensor, AutoBrightness, BrightnessSchedule,
+                             IdleDimmer, PowerProfiles, find_light_sensor)
+from brightness_ipc import CommandServer, send_command
 
-class BrightnessConfig:
-    """Handle configuration loading and saving"""
-    def __init__(self):
-        self.config_file = Path.home() / ".config" / "legion-brightness" / "config.json"
-        self.config = self.load_config()
-    
-    def load_config(self):
-        """Load configuration from file or create default"""
-        self.config_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        default_config = {
-            "intel_max": 496,
-            "use_pkexec": False,
-            "last_brightness": 50
-        }
-        
-        if self.config_file.exists():
-            try:
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    for key, value in default_config.items():
-                        if key not in config:
-                            config[key] = value
-                    return config
-            except Exception as e:
-                return default_config
-        else:
-            self.save_config(default_config)
-            return default_config
-    
-    def save_config(self, config=None):
-        """Save configuration to file"""
-        if config:
-            self.config = config
-        try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, indent=2, fp=f)
-        except Exception as e:
-            pass
+LOGIND = "org.freedesktop.login1"
 
-class BrightnessController:
-    """Handle brightness control operations"""
-    def __init__(self, config):
-        self.config = config
-    
-    def set_brightness(self, percentage):
-        """Set brightness for Intel backlight"""
-        intel_value = int((percentage / 100) * self.config['intel_max'])
-        sudo_cmd = ["pkexec"] if self.config['use_pkexec'] else ["sudo"]
-        
-        try:
-            cmd = sudo_cmd + ["brightnessctl", "--device=intel_backlight", "set", str(intel_value)]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-            return result.returncode == 0
-        except Exception as e:
-            return False
-    
-    def get_current_brightness(self):
-        """Get current brightness from Intel backlight"""
-        try:
-            result = subprocess.run(["brightnessctl", "--device=intel_backlight", "get"],
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                current = int(result.stdout.strip())
-                percentage = int((current / self.config['intel_max']) * 100)
-                return percentage
-        except Exception as e:
-            pass
-        return None
+# Set by benchmark_startup.py to print startup milestones and exit
+STARTUP_BENCHMARK = os.environ.get("LEGION_BRIGHTNESS_STARTUP_BENCHMARK") == "1"
+
+def report_startup(stage):
+    """Print a startup milestone with a wall-clock timestamp"""
+    print(f"startup {stage} {time.time():.6f}", flush=True)
 
 class SettingsDialog(Gtk.Dialog):
     """Settings dialog"""
@@ -128,6 +82,7 @@ class SettingsDialog(Gtk.Dialog):
         
         # Connect OK button
         self.connect("response", self.on_response)
+        self.changed = set()
     
     def on_response(self, dialog, response):
         """Handle dialog response"""
@@ -135,21 +90,112 @@ class SettingsDialog(Gtk.Dialog):
             try:
                 intel_max = int(self.intel_entry.get_text())
                 if intel_max > 0:
-                    self.config_manager.config['intel_max'] = intel_max
-                    self.config_manager.config['use_pkexec'] = self.pkexec_check.get_active()
-                    self.config_manager.save_config()
+                    self.changed = self.config_manager.update({
+                        'intel_max': intel_max,
+                        'use_pkexec': self.pkexec_check.get_active(),
+                    })
             except ValueError:
                 pass
 
+class DiagnosticsDialog(Gtk.Dialog):
+    """Show brightness operation metrics and export them"""
+    
+    def __init__(self, config_manager):
+        super().__init__(title="Diagnostics")
+        self.export_dir = config_manager.config_file.parent
+        
+        self.set_default_size(460, 360)
+        self.add_button("Export JSON", 1)
+        self.add_button("Export Prometheus", 2)
+        self.add_button("Refresh", 3)
+        self.add_button("Close", Gtk.ResponseType.CLOSE)
+        
+        box = self.get_content_area()
+        box.set_margin_top(10)
+        box.set_margin_bottom(10)
+        box.set_margin_start(10)
+        box.set_margin_end(10)
+        
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_vexpand(True)
+        self.text_view = Gtk.TextView()
+        self.text_view.set_editable(False)
+        self.text_view.set_monospace(True)
+        scrolled.add(self.text_view)
+        box.pack_start(scrolled, True, True, 0)
+        
+        self.status_label = Gtk.Label()
+        self.status_label.set_xalign(0)
+        box.pack_start(self.status_label, False, False, 5)
+        
+        self.refresh()
+        self.show_all()
+        self.connect("response", self.on_response)
+    
+    def refresh(self):
+        """Render the current metrics snapshot"""
+        snapshot = metrics.snapshot()
+        lines = [f"{'operation':22} {'ok':>6} {'fail':>5} {'t/o':>4} {'mean ms':>9} {'p99 ms':>8}"]
+        for name, stats in sorted(snapshot["operations"].items()):
+            p99 = "-" if stats["p99_ms"] is None else f"<{stats['p99_ms']:g}"
+            lines.append(f"{name:22} {stats['success']:6} {stats['failure']:5} {stats['timeout']:4}"
+                         f" {stats['mean_ms']:9.3f} {p99:>8}")
+        lines.append("")
+        for event, count in sorted(snapshot["events"].items()):
+            lines.append(f"{event:30} {count}")
+        ramps = snapshot["events"].get("transitions")
+        if ramps:
+            writes = snapshot["events"].get("transition_writes", 0)
+            lines.append(f"{'writes per transition':30} {writes / ramps:.1f}")
+        if snapshot["recent_errors"]:
+            lines.append("")
+            lines.append("Recent errors:")
+            for error in snapshot["recent_errors"][-5:]:
+                when = time.strftime("%H:%M:%S", time.localtime(error["time"]))
+                lines.append(f"  {when} {error['operation']}/{error['backend']}: {error['error']}")
+        self.text_view.get_buffer().set_text("\n".join(lines))
+    
+    def on_response(self, dialog, response):
+        """Handle export, refresh and close buttons"""
+        if response == 1:
+            path = metrics.export(self.export_dir / "metrics.json")
+            self.status_label.set_markup(f"<small>Saved {path}</small>")
+        elif response == 2:
+            path = metrics.export(self.export_dir / "legion_brightness.prom", prometheus=True)
+            self.status_label.set_markup(f"<small>Saved {path}</small>")
+        elif response == 3:
+            self.refresh()
+        else:
+            self.destroy()
+
 class SystemTrayApplet:
     """System tray indicator for brightness control"""
     
     def __init__(self):
-        self.config_manager = BrightnessConfig()
-        self.controller = BrightnessController(self.config_manager.config)
+        self.config_manager = BrightnessConfig(scheduler=GLib.timeout_add)
+        # Backends start from the first idle callback, once the indicator is up
+        self.controller = None
+        self.transition = None
+        self.worker = None
+        self.monitor = None
+        self.monitor_sources = {}
+        self.command_server = None
+        self.auto_brightness = None
+        self.power_profiles = None
         self.window = None
+        self.diagnostics_dialog = None
         self.updating_slider = False
         
+        # Time-of-day schedule; the clock watch re-syncs it after clock jumps and resume
+        self.schedule = None
+        self.clock_watch = None
+        self.clock_source = None
+        
+        # Dim while logind reports the session idle
+        self.idle_dimmer = None
+        self.idle_bus = None
+        self.idle_subscription = None
+        
         # Find icon path
         icon_path = Path(__file__).parent / "icon.svg"
         icon_name = str(icon_path) if icon_path.exists() else "legion-brightness"
@@ -161,23 +207,40 @@ class SystemTrayApplet:
             AppIndicator3.IndicatorCategory.HARDWARE
         )
         self.indicator.set_status(AppIndicator3.IndicatorStatus.ACTIVE)
+        self.update_indicator_label(self.config_manager.config['last_brightness'])
+        
+        # Scrolling on the icon adds up notches into one throttled target
+        self.scroll_target = None
+        self.scroll_throttle = self.create_scroll_throttle()
+        self.indicator.connect("scroll-event", self.on_scroll)
         
         # Create menu
         menu = Gtk.Menu()
         
         # Quick brightness options
-        for brightness in [100, 80, 67, 50, 40, 20]:
+        for brightness in PRESETS:
             item = Gtk.MenuItem(label=f"Set {brightness}%")
             item.connect("activate", self.set_quick_brightness, brightness)
             menu.append(item)
         
         menu.append(Gtk.SeparatorMenuItem())
         
+        # Auto brightness toggle, enabled once the sensor has been looked for
+        self.auto_item = Gtk.CheckMenuItem(label="Auto Brightness")
+        self.auto_item.set_sensitive(False)
+        self.auto_toggled = self.auto_item.connect("toggled", self.on_auto_toggled)
+        menu.append(self.auto_item)
+        
         # Show window item
         show_item = Gtk.MenuItem(label="Show Full Control")
         show_item.connect("activate", self.show_window)
         menu.append(show_item)
         
+        # Diagnostics item
+        diagnostics_item = Gtk.MenuItem(label="Diagnostics")
+        diagnostics_item.connect("activate", self.show_diagnostics)
+        menu.append(diagnostics_item)
+        
         menu.append(Gtk.SeparatorMenuItem())
         
         # Quit item
@@ -188,17 +251,401 @@ class SystemTrayApplet:
         menu.show_all()
         self.indicator.set_menu(menu)
         
+        GLib.idle_add(self.start_backends)
+    
+    def start_backends(self):
+        """Probe routes and start the worker, watches and policies after the indicator is shown"""
+        config = self.config_manager.config
+        routes = dict(config.get('backend_routes', {}))
+        self.controller = BrightnessController(config)
+        self.controller.on_route_changed = lambda name, route: GLib.idle_add(
+            self.on_route_changed, name, route)
+        # Keep a newly probed route, but never write defaults over a config that did not parse
+        if config.get('backend_routes', {}) != routes and not self.config_manager.load_failed:
+            self.config_manager.schedule_save()
+        self.transition = BrightnessTransition(self.controller)
+        self.worker = BrightnessWorker(self.controller, dispatch=GLib.idle_add,
+                                       transition=self.transition)
+        
+        # Ambient light sensor driven auto brightness, when the laptop has one
+        sensor_path = find_light_sensor(config['iio_root'])
+        if sensor_path is not None:
+            self.auto_brightness = AutoBrightness(AmbientLightSensor(sensor_path),
+                                                  config,
+                                                  self.apply_auto_brightness,
+                                                  scheduler=GLib.timeout_add,
+                                                  cancel=GLib.source_remove)
+            self.auto_item.set_sensitive(True)
+        
+        # Separate AC and battery brightness, switched on power_supply uevents
+        if config['power_profiles_enabled']:
+            self.power_profiles = PowerProfiles(config,
+                                                self.apply_auto_brightness,
+                                                on_saved=self.config_manager.schedule_save)
+        
+        if config['idle_dim_enabled']:
+            self.start_idle_dim()
+        
+        # Track the real brightness from backlight change events
+        self.update_monitor()
+        
+        # Accept commands from CLI calls and later launches
+        self.command_server = CommandServer(self.on_command, watch=self.watch_command_fd)
+        if not self.command_server.start():
+            # The tray works the same without it; only CLI calls cannot reach it
+            print("Legion Brightness: running without the command socket", file=sys.stderr)
+        
+        # Pick up edits made by install.sh, the CLI, another instance or by hand
+        fd = self.config_manager.watch()
+        if fd is not None:
+            GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_config_event)
+        
+        # Only reflect the setting here; the toggled handler would save it again
+        with self.auto_item.handler_block(self.auto_toggled):
+            self.auto_item.set_active(self.auto_brightness is not None and config['auto_brightness'])
+        if self.auto_brightness is not None and config['auto_brightness']:
+            self.auto_brightness.start()
+        
+        # Pick up a plug/unplug that happened while the applet was not running
+        self.on_power_changed()
+        
+        if config['schedule_enabled']:
+            self.start_schedule()
+        if STARTUP_BENCHMARK:
+            report_startup("ready")
+        return False
+    
+    def watch_command_fd(self, fd):
+        """Register a command socket fd with the main loop"""
+        GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                          self.on_command_event)
+    
+    def on_command_event(self, fd, condition):
+        """Handle activity on a command socket"""
+        return self.command_server.handle(fd)
+    
+    def on_command(self, command, args):
+        """Execute a command from the CLI and return the reply line"""
+        if command == "PING":
+            return "OK"
+        if command == "GET":
+            return f"OK {self.current_brightness()}"
+        if command == "SHOW":
+            self.show_window(None)
+            return "OK"
+        try:
+            value = int(args[0])
+        except (IndexError, ValueError):
+            return "ERR bad request"
+        if command == "SET":
+            target = value
+        elif command == "UP":
+            target = self.current_brightness() + value
+        elif command == "DOWN":
+            target = self.current_brightness() - value
+        elif command == "PRESET" and 1 <= value <= len(PRESETS):
+            target = PRESETS[value - 1]
+        else:
+            return "ERR bad request"
+        target = self.set_brightness(max(1, min(100, target)))
+        return f"OK {target}"
+    
+    def current_brightness(self):
+        """Return the latest target, or the monitored value if it was changed elsewhere"""
+        last = self.config_manager.config['last_brightness']
+        # The monitor overwrites last_raw only when something else moved the backlight
+        if self.worker.busy or self.monitor.current is None or \
+                self.controller.last_raw.get(self.controller.primary) == self.controller.to_raw(last):
+            return last
+        return self.monitor.current
+    
+    def update_monitor(self):
+        """Watch the primary device, rebuilding the monitor when the primary or its root changed"""
+        device = self.controller.devices.get(self.controller.primary)
+        root = device.root if device else self.config_manager.config['sysfs_root']
+        path = os.path.join(root, self.controller.primary)
+        if self.monitor is not None:
+            if self.monitor.reader.path == path:
+                return False
+            for source_id in self.monitor_sources.values():
+                GLib.source_remove(source_id)
+            self.monitor_sources = {}
+            self.monitor.close()
+        self.monitor = BrightnessMonitor(self.controller, self.controller.primary, root,
+                                         on_change=self.on_brightness_changed,
+                                         on_devices_changed=self.on_devices_changed,
+                                         on_power_changed=self.on_power_changed)
+        self.monitor.start()
+        self.sync_monitor_watches()
+        return False
+    
+    def on_devices_changed(self):
+        """Pick up added or removed backlight devices"""
+        self.controller.refresh_devices()
+        # The monitor is still handling the uevent, so it is replaced once that returns
+        GLib.idle_add(self.update_monitor)
+    
+    def on_monitor_event(self, fd, condition):
+        """Handle a backlight change event"""
+        self.monitor.handle(fd)
+        return self.sync_monitor_watches(fd)
+    
+    def sync_monitor_watches(self, current=None):
+        """Watch the monitor's fds, dropping ones it closed; return whether current is still watched
+
+        A failed read closes the attribute fd, and GLib would report POLLNVAL
+        on it in a busy loop, so its watch is removed until the fd reopens.
+        """
+        watches = dict(self.monitor.watches())
+        for fd, source_id in list(self.monitor_sources.items()):
+            if fd not in watches:
+                del self.monitor_sources[fd]
+                if fd != current:
+                    GLib.source_remove(source_id)
+        for fd, kind in watches.items():
+            if fd not in self.monitor_sources:
+                condition = GLib.IO_PRI | GLib.IO_ERR if kind == "pri" else GLib.IO_IN
+                self.monitor_sources[fd] = GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, condition,
+                                                             self.on_monitor_event)
+        return current in self.monitor_sources
+    
+    def on_brightness_changed(self, value):
+        """Follow brightness changes made by hotkeys, other tools or resume"""
+        if self.worker.busy:
+            return
+        self.worker.current = value
+        if not self.scroll_throttle.active:
+            self.update_indicator_label(self.current_brightness())
+        if self.window is not None:
+            self.window.on_brightness_changed(value)
+    
+    def update_indicator_label(self, brightness):
+        """Show the brightness next to the tray icon"""
+        if self.config_manager.config['indicator_label']:
+            self.indicator.set_label(f"{int(brightness)}%", "100%")
+    
+    def create_scroll_throttle(self):
+        """Send scroll targets at most every SCROLL_INTERVAL_MS, keeping the last one"""
+        # Notches are discrete steps like brightness hotkeys, so they skip the ramp
+        return SliderThrottle(lambda brightness: self.set_brightness(brightness, ramp=False),
+                              latency=lambda: self.controller.write_latency,
+                              scheduler=GLib.timeout_add, cancel=GLib.source_remove,
+                              clock=lambda: GLib.get_monotonic_time() / 1e6,
+                              min_interval_ms=SCROLL_INTERVAL_MS)
+    
+    def on_scroll(self, indicator, steps, direction):
+        """Adjust brightness by scroll_step per wheel or touchpad notch on the icon"""
+        if self.worker is None:
+            return
+        if direction == Gdk.ScrollDirection.UP:
+            sign = 1
+        elif direction == Gdk.ScrollDirection.DOWN:
+            sign = -1
+        else:
+            return
+        # Notches arriving while a target is held back add up on top of it
+        if self.scroll_target is None or not self.scroll_throttle.active:
+            self.scroll_target = self.current_brightness()
+        step = self.config_manager.config['scroll_step']
+        self.scroll_target = max(1, min(100, self.scroll_target + sign * max(1, steps) * step))
+        self.update_indicator_label(self.scroll_target)
+        self.scroll_throttle.push(self.scroll_target)
     
     def set_quick_brightness(self, widget, brightness):
         """Set brightness quickly from menu"""
-        self.controller.set_brightness(brightness)
+        if self.worker is None:
+            return
+        self.set_brightness(brightness)
+    
+    def on_auto_toggled(self, item):
+        """Turn ambient light auto brightness on or off"""
+        self.config_manager.config['auto_brightness'] = item.get_active()
+        self.config_manager.schedule_save()
+        if self.auto_brightness is None:
+            return
+        if item.get_active():
+            self.auto_brightness.start()
+        else:
+            self.auto_brightness.stop()
+    
+    def apply_auto_brightness(self, brightness):
+        """Apply a target chosen by an automatic policy without saving it"""
+        if self.idle_dimmer is not None and self.idle_dimmer.dimmed:
+            return
+        if self.power_profiles is not None:
+            brightness = self.power_profiles.limit(brightness)
+        self.worker.post(brightness)
+        self.update_indicator_label(brightness)
+        if self.window is not None:
+            self.window.on_brightness_changed(brightness)
+    
+    def on_route_changed(self, name, route):
+        """Store and save a route the worker probed after a failed write"""
+        # Replace the dict rather than edit it, so a save or a reprobe never sees it half-changed
+        routes = dict(self.config_manager.config.get('backend_routes', {}))
+        routes[name] = route
+        self.config_manager.config['backend_routes'] = routes
+        self.config_manager.schedule_save()
+        return False
+    
+    def on_power_changed(self):
+        """Switch brightness profile when AC is plugged in or removed"""
+        if self.power_profiles is not None:
+            self.power_profiles.update()
+    
+    def start_schedule(self):
+        """Follow the time-of-day schedule and re-sync it after clock jumps"""
+        self.schedule = BrightnessSchedule(self.config_manager.config,
+                                           self.apply_auto_brightness,
+                                           scheduler=GLib.timeout_add,
+                                           cancel=GLib.source_remove)
+        self.clock_watch = ClockWatch()
+        fd = self.clock_watch.start()
+        if fd is not None:
+            self.clock_source = GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                                                  self.on_clock_changed)
+        self.schedule.start()
+    
+    def stop_schedule(self):
+        """Disarm the schedule and close its clock watch"""
+        if self.schedule is None:
+            return
+        self.schedule.stop()
+        if self.clock_source is not None:
+            GLib.source_remove(self.clock_source)
+            self.clock_source = None
+        self.clock_watch.close()
+        self.schedule = None
+        self.clock_watch = None
+    
+    def start_idle_dim(self):
+        """Create the idle dimmer and subscribe to logind"""
+        self.idle_dimmer = IdleDimmer(self.config_manager.config, self.apply_idle_brightness)
+        self.watch_idle_hint()
+    
+    def stop_idle_dim(self):
+        """Restore brightness if dimmed and unsubscribe from logind"""
+        if self.idle_dimmer is None:
+            return
+        self.idle_dimmer.set_idle(False)
+        if self.idle_subscription is not None:
+            self.idle_bus.signal_unsubscribe(self.idle_subscription)
+        self.idle_dimmer = None
+        self.idle_bus = None
+        self.idle_subscription = None
+    
+    def on_config_event(self, fd, condition):
+        """Reload config.json after another program changed it"""
+        changed = self.config_manager.handle(fd)
+        if changed:
+            self.apply_config_changes(changed)
+        return True
+    
+    def apply_config_changes(self, changed):
+        """Push changed settings to the parts that act on them, without rebuilding the UI
+
+        Everything else (curves, transitions, sensor mapping, profile caps,
+        idle level) reads the shared config dict on use.
+        """
+        config = self.config_manager.config
+        self.controller.reconfigure(changed)
+        self.update_monitor()
+        if 'auto_brightness' in changed:
+            # The toggled handler starts or stops the policy
+            self.auto_item.set_active(self.auto_brightness is not None and config['auto_brightness'])
+        if 'power_profiles_enabled' in changed:
+            self.power_profiles = None
+            if config['power_profiles_enabled']:
+                self.power_profiles = PowerProfiles(config, self.apply_auto_brightness,
+                                                    on_saved=self.config_manager.schedule_save)
+                self.on_power_changed()
+        if 'schedule_enabled' in changed:
+            self.stop_schedule()
+            if config['schedule_enabled']:
+                self.start_schedule()
+        elif self.schedule is not None and changed & {'schedule', 'schedule_ramp_minutes'}:
+            self.schedule.resync()
+        if changed & {'idle_dim_enabled', 'idle_bus'}:
+            self.stop_idle_dim()
+            if config['idle_dim_enabled']:
+                self.start_idle_dim()
+        if changed & {'indicator_label', 'last_brightness'}:
+            self.update_indicator_label(self.current_brightness())
+    
+    def watch_idle_hint(self):
+        """Subscribe to IdleHint changes of this logind session"""
+        bus_type = Gio.BusType.SESSION if self.config_manager.config['idle_bus'] == "session" \
+            else Gio.BusType.SYSTEM
+        try:
+            self.idle_bus = Gio.bus_get_sync(bus_type, None)
+            # Signals carry the real session path, not the "auto" alias
+            reply = self.idle_bus.call_sync(LOGIND, "/org/freedesktop/login1",
+                                            "org.freedesktop.login1.Manager", "GetSession",
+                                            GLib.Variant("(s)", (os.environ.get("XDG_SESSION_ID", "auto"),)),
+                                            GLib.VariantType("(o)"), Gio.DBusCallFlags.NONE,
+                                            1000, None)
+        except GLib.Error as e:
+            self.idle_bus = None
+            return
+        self.idle_subscription = self.idle_bus.signal_subscribe(
+            LOGIND, "org.freedesktop.DBus.Properties", "PropertiesChanged", reply.unpack()[0],
+            "org.freedesktop.login1.Session", Gio.DBusSignalFlags.NONE,
+            self.on_session_properties_changed)
+    
+    def on_session_properties_changed(self, connection, sender, path, interface, signal_name,
+                                      parameters):
+        """Dim or restore when the session's IdleHint changes"""
+        changed = parameters.unpack()[1]
+        if "IdleHint" in changed:
+            self.idle_dimmer.set_idle(changed["IdleHint"])
+    
+    def apply_idle_brightness(self, brightness):
+        """Dim or restore with a single write, leaving last_brightness alone"""
+        self.worker.post(brightness, ramp=False)
+        self.update_indicator_label(brightness)
+        if self.window is not None:
+            self.window.on_brightness_changed(brightness)
+    
+    def on_clock_changed(self, fd, condition):
+        """Re-sync the schedule after the wall clock jumped or the system resumed"""
+        if self.clock_watch.handle():
+            # The firmware may have reset the panel while suspended
+            self.worker.invalidate()
+            self.schedule.resync()
+        return True
+    
+    def note_manual_brightness(self, brightness):
+        """Tell the automatic policies about a manual change; return the value to apply"""
+        if self.power_profiles is not None:
+            brightness = self.power_profiles.limit(brightness)
+            self.power_profiles.note_manual(brightness)
+        if self.auto_brightness is not None and self.auto_brightness.running:
+            self.auto_brightness.note_manual(brightness)
+        if self.schedule is not None:
+            self.schedule.note_manual(brightness)
+        if self.idle_dimmer is not None:
+            self.idle_dimmer.note_manual(brightness)
+        return brightness
+    
+    def set_brightness(self, brightness, ramp=True):
+        """Post a new brightness, remember it and return the value applied"""
+        brightness = self.note_manual_brightness(brightness)
+        self.worker.post(brightness, ramp=ramp)
         self.config_manager.config['last_brightness'] = brightness
-        self.config_manager.save_config()
+        self.config_manager.schedule_save()
+        self.update_indicator_label(brightness)
+        if self.window is not None:
+            self.window.on_brightness_changed(brightness)
+        return brightness
     
     def show_window(self, widget):
-        """Show the brightness control window"""
-        if self.window is None or not self.window.get_visible():
+        """Show the brightness control window, building it on first use"""
+        if self.worker is None:
+            return
+        if self.window is None:
             self.window = BrightnessApplet(self)
+        if not self.window.get_visible():
+            self.window.load_current_brightness()
             self.window.show_all()
             # Position window at bottom-right corner
             screen = self.window.get_screen()
@@ -211,12 +658,43 @@ class SystemTrayApplet:
         else:
             self.window.present()
     
+    def show_diagnostics(self, widget):
+        """Show the diagnostics dialog, reusing an open one"""
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self.config_manager)
+            self.diagnostics_dialog.connect("destroy", self.on_diagnostics_destroyed)
+        else:
+            self.diagnostics_dialog.refresh()
+            self.diagnostics_dialog.present()
+    
+    def on_diagnostics_destroyed(self, dialog):
+        """Forget the closed diagnostics dialog"""
+        self.diagnostics_dialog = None
+    
     def on_window_closed(self):
-        """Handle window close"""
-        self.window = None
+        """Handle window close - the window is kept for reuse"""
+        self.config_manager.flush()
+    
+    def on_signal(self, signum):
+        """Flush pending config on SIGUSR1, flush and quit on SIGTERM/SIGINT"""
+        self.config_manager.flush()
+        if signum != signal.SIGUSR1:
+            self.quit(None)
+        return True
     
     def quit(self, widget):
         """Quit the application"""
+        self.config_manager.flush()
+        if self.auto_brightness is not None:
+            self.auto_brightness.stop()
+            self.auto_brightness.sensor.close()
+        self.stop_schedule()
+        self.stop_idle_dim()
+        self.config_manager.close()
+        # These are still None when quit comes before start_backends ran
+        for part in (self.worker, self.monitor, self.command_server, self.controller):
+            if part is not None:
+                part.close()
         Gtk.main_quit()
 
 class BrightnessApplet(Gtk.Window):
@@ -232,6 +710,10 @@ class BrightnessApplet(Gtk.Window):
         self.config_manager = tray_applet.config_manager
         self.controller = tray_applet.controller
         self.updating = False
+        self.status_timer = None
+        self.settings_dialog = None
+        
+        self.throttle = self.create_throttle()
         
         # Connect close event to hide instead of destroy
         self.connect("delete-event", self.on_close)
@@ -251,7 +733,8 @@ class BrightnessApplet(Gtk.Window):
         
         # Brightness percentage label
         self.brightness_label = Gtk.Label()
-        self.brightness_label.set_markup("<span font='28' weight='bold'>50%</span>")
+        self.brightness_label.set_markup(
+            f"<span font='28' weight='bold'>{self.config_manager.config['last_brightness']}%</span>")
         vbox.pack_start(self.brightness_label, False, False, 5)
         
         # Vertical scale (slider)
@@ -297,31 +780,76 @@ class BrightnessApplet(Gtk.Window):
         close_btn.connect("clicked", self.on_close_clicked)
         button_box.pack_start(close_btn, True, True, 0)
         
-        # Load current brightness
-        self.load_current_brightness()
-        
-        # Timeout for debounced updates
-        self.update_timeout = None
+        if STARTUP_BENCHMARK:
+            self.connect("draw", self.on_first_draw)
+    
+    def create_throttle(self):
+        """Leading-edge, latency-matched delivery of slider drags"""
+        return SliderThrottle(self.apply_brightness,
+                              latency=lambda: self.controller.write_latency,
+                              scheduler=GLib.timeout_add, cancel=GLib.source_remove,
+                              clock=lambda: GLib.get_monotonic_time() / 1e6)
     
     def on_close(self, widget, event):
         """Handle window close - hide instead of destroy"""
-        self.hide()
-        self.tray_applet.on_window_closed()
+        self.hide_window()
         return True  # Prevent destroy
     
     def on_close_clicked(self, button):
         """Handle close button click"""
+        self.hide_window()
+    
+    def hide_window(self):
+        """Hide the window, dropping its pending status reset"""
+        self.set_status("<small>Ready</small>")
         self.hide()
         self.tray_applet.on_window_closed()
     
+    def set_status(self, markup, clear_after_ms=None):
+        """Show a status message, replacing any pending reset to Ready"""
+        if self.status_timer is not None:
+            GLib.source_remove(self.status_timer)
+            self.status_timer = None
+        self.status_label.set_markup(markup)
+        if clear_after_ms is not None:
+            self.status_timer = GLib.timeout_add(clear_after_ms, self.on_status_timeout)
+    
+    def on_status_timeout(self):
+        """Reset the status label once a message has been shown long enough"""
+        self.status_timer = None
+        self.status_label.set_markup("<small>Ready</small>")
+        return False
+    
+    def on_first_draw(self, widget, cr):
+        """Report the first frame during a startup benchmark"""
+        report_startup("window")
+        GLib.idle_add(Gtk.main_quit)
+        self.disconnect_by_func(self.on_first_draw)
+        return False
+    
     def load_current_brightness(self):
-        """Load current brightness on startup"""
+        """Show the cached brightness, reading the real value in the background if needed"""
+        current = self.tray_applet.monitor.current
+        if current is not None:
+            self.on_brightness_changed(current)
+        else:
+            threading.Thread(target=self.read_current_brightness, daemon=True).start()
+    
+    def read_current_brightness(self):
+        """Read brightness off the main loop and hand it back to the slider"""
         current = self.controller.get_current_brightness()
         if current is not None:
-            self.updating = True
-            self.scale.set_value(current)
-            self.updating = False
-            self.update_label(current)
+            GLib.idle_add(self.on_brightness_changed, current)
+    
+    def on_brightness_changed(self, value):
+        """Move the slider to an externally changed brightness"""
+        if self.throttle.active:
+            return False
+        self.updating = True
+        self.scale.set_value(value)
+        self.updating = False
+        self.update_label(value)
+        return False
     
     def update_label(self, value):
         """Update the brightness percentage label"""
@@ -334,50 +862,47 @@ class BrightnessApplet(Gtk.Window):
         
         value = int(scale.get_value())
         self.update_label(value)
-        
-        # Debounce: cancel previous timeout and set new one
-        if self.update_timeout:
-            GLib.source_remove(self.update_timeout)
-        
-        self.update_timeout = GLib.timeout_add(300, self.apply_brightness, value)
+        self.throttle.push(value)
     
     def apply_brightness(self, value):
-        """Apply brightness change (called after debounce)"""
-        self.status_label.set_markup("<small><span foreground='blue'>Setting...</span></small>")
-        
-        success = self.controller.set_brightness(value)
+        """Apply brightness change (called by the slider throttle)"""
+        self.set_status("<small><span foreground='blue'>Setting...</span></small>")
         
+        # Write on the background worker; on_brightness_applied reports back.
+        # The drag itself is the motion, so it skips the ramp like scroll notches
+        value = self.tray_applet.note_manual_brightness(value)
+        self.tray_applet.worker.post(value, self.on_brightness_applied, ramp=False)
+    
+    def on_brightness_applied(self, value, success):
+        """Update status once the background write has finished"""
         if success:
-            self.status_label.set_markup("<small><span foreground='green'>✓ Set</span></small>")
+            self.set_status("<small><span foreground='green'>✓ Set</span></small>", 2000)
             self.config_manager.config['last_brightness'] = value
-            self.config_manager.save_config()
+            self.config_manager.schedule_save()
         else:
-            self.status_label.set_markup("<small><span foreground='red'>✗ Failed</span></small>")
-        
-        # Clear status after 2 seconds
-        GLib.timeout_add(2000, lambda: self.status_label.set_markup("<small>Ready</small>"))
-        
-        self.update_timeout = None
+            self.set_status("<small><span foreground='red'>✗ Failed</span></small>", 2000)
         return False
     
     def on_refresh_clicked(self, button):
         """Refresh current brightness"""
+        self.tray_applet.monitor.refresh()
         self.load_current_brightness()
-        self.status_label.set_markup("<small><span foreground='green'>✓ Refreshed</span></small>")
-        GLib.timeout_add(1500, lambda: self.status_label.set_markup("<small>Ready</small>"))
+        self.set_status("<small><span foreground='green'>✓ Refreshed</span></small>", 1500)
     
     def on_settings_clicked(self, button):
-        """Open settings dialog"""
-        dialog = SettingsDialog(self, self.config_manager, self.controller)
-        response = dialog.run()
+        """Open settings dialog, or raise the one already open"""
+        if self.settings_dialog is not None:
+            self.settings_dialog.present()
+            return
+        self.settings_dialog = SettingsDialog(self, self.config_manager, self.controller)
+        response = self.settings_dialog.run()
         
         if response == Gtk.ResponseType.OK:
-            # Reload controller config
-            self.controller.config = self.config_manager.config
-            self.status_label.set_markup("<small><span foreground='green'>✓ Saved</span></small>")
-            GLib.timeout_add(1500, lambda: self.status_label.set_markup("<small>Ready</small>"))
+            self.tray_applet.apply_config_changes(self.settings_dialog.changed)
+            self.set_status("<small><span foreground='green'>✓ Saved</span></small>", 1500)
         
-        dialog.destroy()
+        self.settings_dialog.destroy()
+        self.settings_dialog = None
 
 class SettingsDialog(Gtk.Dialog):
     """Settings dialog"""
@@ -425,6 +950,7 @@ class SettingsDialog(Gtk.Dialog):
         
         # Connect OK button
         self.connect("response", self.on_response)
+        self.changed = set()
     
     def on_response(self, dialog, response):
         """Handle dialog response"""
@@ -432,14 +958,23 @@ class SettingsDialog(Gtk.Dialog):
             try:
                 intel_max = int(self.intel_entry.get_text())
                 if intel_max > 0:
-                    self.config_manager.config['intel_max'] = intel_max
-                    self.config_manager.config['use_pkexec'] = self.pkexec_check.get_active()
-                    self.config_manager.save_config()
+                    self.changed = self.config_manager.update({
+                        'intel_max': intel_max,
+                        'use_pkexec': self.pkexec_check.get_active(),
+                    })
             except ValueError:
                 pass
 
 def main():
+    # Only one tray per session: a second launch just shows the existing window
+    if send_command("SHOW") is not None:
+        return
     tray = SystemTrayApplet()
+    if STARTUP_BENCHMARK:
+        report_startup("indicator")
+        GLib.idle_add(tray.show_window, None)
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, tray.on_signal, signum)
     Gtk.main()
 
 if __name__ == "__main__":
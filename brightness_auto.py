@@ -0,0 +1,417 @@
+"""
+Lenovo Legion Brightness Control - Automatic Brightness
+Policies that pick brightness targets on their own and feed them to the
+controller. Imports no GTK; timers come from an injected scheduler
+(GLib.timeout_add in the tray) so everything can be driven from tests.
+"""
+
+import math
+import os
+import time
+from pathlib import Path
+
+from brightness_core import IIO_ROOT, SYSFS_POWER_SUPPLY_ROOT
+
+def find_light_sensor(root=IIO_ROOT):
+    """Return the first IIO device directory exposing illuminance, or None"""
+    try:
+        for path in sorted(Path(root).iterdir()):
+            if (path / "in_illuminance_input").exists() or (path / "in_illuminance_raw").exists():
+                return path
+    except OSError as e:
+        pass
+    return None
+
+class AmbientLightSensor:
+    """Read lux from an IIO ambient light sensor, keeping the attribute open"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.scale = 1.0
+        self.offset = 0.0
+        attribute = self.path / "in_illuminance_input"
+        if not attribute.exists():
+            attribute = self.path / "in_illuminance_raw"
+            self.scale = self._read_float("in_illuminance_scale", 1.0)
+            self.offset = self._read_float("in_illuminance_offset", 0.0)
+        self.attribute = attribute
+        self._fd = None
+
+    def _read_float(self, name, default):
+        try:
+            return float((self.path / name).read_text().strip())
+        except (OSError, ValueError) as e:
+            return default
+
+    def read_lux(self):
+        """Return the current illuminance in lux, or None on failure"""
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.attribute, os.O_RDONLY)
+            raw = float(os.pread(self._fd, 32, 0).strip())
+        except (OSError, ValueError) as e:
+            self.close()
+            return None
+        return max(0.0, (raw + self.offset) * self.scale)
+
+    def close(self):
+        """Close the kept-open attribute"""
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError as e:
+                pass
+            self._fd = None
+
+class AutoBrightness:
+    """Drive brightness from ambient light with adaptive, low-wakeup sampling
+
+    One one-shot timer is armed for the next sample. While the light is
+    changing it samples every FAST_INTERVAL_MS; every stable sample doubles
+    the interval up to SLOW_INTERVAL_MS, so a steady room costs about one
+    wakeup a minute. Lux is smoothed in the log domain, and a new target is
+    only applied when it differs from the last one by at least
+    als_hysteresis percent, so the backlight never flickers between levels
+    and a manual change holds until the room gets brighter or darker.
+    """
+    FAST_INTERVAL_MS = 500
+    SLOW_INTERVAL_MS = 60000
+    CHANGE_THRESHOLD = 0.15  # log10(lux) change that counts as "light is changing"
+    SMOOTHING = 0.4
+
+    def __init__(self, sensor, config, apply, scheduler=None, cancel=None):
+        self.sensor = sensor
+        self.config = config
+        self.apply = apply
+        self.scheduler = scheduler
+        self.cancel_timer = cancel
+        self.smoothed = None
+        self.applied = None
+        self.interval_ms = self.FAST_INTERVAL_MS
+        self.samples = 0
+        self._timer = None
+
+    def target_for(self, lux):
+        """Map lux to a brightness percentage on a logarithmic scale"""
+        min_lux = max(0.1, self.config.get('als_min_lux', 1))
+        max_lux = max(min_lux * 1.01, self.config.get('als_max_lux', 1000))
+        low = self.config.get('als_min_brightness', 10)
+        high = self.config.get('als_max_brightness', 100)
+        position = (math.log10(max(lux, min_lux)) - math.log10(min_lux)) / \
+            (math.log10(max_lux) - math.log10(min_lux))
+        return round(low + (high - low) * min(1.0, position))
+
+    def sample(self):
+        """Take one reading, apply a new target if needed and return the next interval"""
+        self.samples += 1
+        lux = self.sensor.read_lux()
+        if lux is None:
+            self.interval_ms = self.SLOW_INTERVAL_MS
+            return self.interval_ms
+
+        level = math.log10(max(lux, 0.1))
+        if self.smoothed is None:
+            self.smoothed = level
+            changing = True
+        else:
+            changing = abs(level - self.smoothed) > self.CHANGE_THRESHOLD
+            self.smoothed += self.SMOOTHING * (level - self.smoothed)
+
+        if changing:
+            self.interval_ms = self.FAST_INTERVAL_MS
+        else:
+            self.interval_ms = min(self.SLOW_INTERVAL_MS, self.interval_ms * 2)
+
+        target = self.target_for(10 ** self.smoothed)
+        if self.applied is None or abs(target - self.applied) >= self.config.get('als_hysteresis', 5):
+            self.applied = target
+            self.apply(target)
+        return self.interval_ms
+
+    def note_manual(self, value):
+        """Keep a manual change until the light itself moves
+
+        The baseline stays the lux-derived target rather than the manual
+        value, so the next sample only applies once that target has moved
+        by als_hysteresis.
+        """
+        if self.smoothed is not None:
+            self.applied = self.target_for(10 ** self.smoothed)
+
+    def start(self):
+        """Sample now and keep sampling on the adaptive timer"""
+        self.stop()
+        self.smoothed = None
+        self.applied = None
+        self.interval_ms = self.FAST_INTERVAL_MS
+        self._on_timer()
+
+    def _on_timer(self):
+        self._timer = None
+        interval = self.sample()
+        if self.scheduler is not None:
+            self._timer = self.scheduler(interval, self._on_timer)
+        return False
+
+    @property
+    def running(self):
+        return self._timer is not None
+
+    def stop(self):
+        """Cancel the pending sample"""
+        if self._timer is not None and self.cancel_timer is not None:
+            self.cancel_timer(self._timer)
+        self._timer = None
+
+def power_source(root=SYSFS_POWER_SUPPLY_ROOT):
+    """Return 'ac' when a mains/USB supply is online or there is no battery, else 'battery'"""
+    has_battery = False
+    try:
+        supplies = sorted(Path(root).iterdir())
+    except OSError as e:
+        return "ac"
+    for path in supplies:
+        try:
+            kind = (path / "type").read_text().strip()
+            if kind == "Battery":
+                has_battery = True
+            elif (path / "online").read_text().strip() == "1":
+                return "ac"
+        except OSError as e:
+            pass
+    return "battery" if has_battery else "ac"
+
+class PowerProfiles:
+    """Separate brightness targets and caps for AC and battery
+
+    Nothing here polls: the tray calls update() when a power_supply uevent
+    arrives, which reads a handful of sysfs attributes and only acts when the
+    source really changed. The brightness used on each source is remembered
+    in config['power_profiles'] and restored on the next switch, capped to
+    that profile's max.
+    """
+
+    def __init__(self, config, apply, root=None, on_saved=None):
+        self.config = config
+        self.apply = apply
+        self.root = root or config.get('power_supply_root', SYSFS_POWER_SUPPLY_ROOT)
+        self.on_saved = on_saved
+        self.source = config.get('power_source')
+        self.switches = 0
+
+    def profile(self, source=None):
+        """Return the profile dict for source (default: the current one)"""
+        profiles = self.config.setdefault('power_profiles', {})
+        return profiles.setdefault(source or self.source or "ac", {"brightness": None, "max": 100})
+
+    def limit(self, value):
+        """Clamp a brightness to the current profile's cap"""
+        cap = self.profile().get('max')
+        return value if cap is None else min(value, cap)
+
+    def note_manual(self, value):
+        """Remember a manual brightness as the target for the current source"""
+        self.profile()['brightness'] = value
+        if self.on_saved is not None:
+            self.on_saved()
+
+    def update(self):
+        """Switch profiles if the power source changed; return True on a switch"""
+        source = power_source(self.root)
+        if source == self.source:
+            return False
+        self.source = source
+        self.config['power_source'] = source
+        self.switches += 1
+        target = self.profile().get('brightness')
+        if target is None:
+            target = self.config.get('last_brightness', 50)
+        self.apply(self.limit(target))
+        if self.on_saved is not None:
+            self.on_saved()
+        return True
+
+def parse_schedule(points):
+    """Return sorted [(seconds after midnight, percent)] from [["HH:MM", percent], ...]"""
+    parsed = {}
+    for point in points or []:
+        try:
+            clock, value = point
+            hours, minutes = (int(part) for part in str(clock).split(":"))
+            if 0 <= hours < 24 and 0 <= minutes < 60:
+                parsed[hours * 3600 + minutes * 60] = max(1, min(100, int(value)))
+        except (TypeError, ValueError) as e:
+            pass
+    return sorted(parsed.items())
+
+class BrightnessSchedule:
+    """Follow a time-of-day brightness schedule with one timer at a time
+
+    Each schedule point is reached by a linear ramp of schedule_ramp_minutes
+    from the previous point's level. Rather than waking up every minute, the
+    exact wall-clock time of the next change is computed: the next 1% step
+    inside a ramp, or the start of the next ramp, and one timer is armed for
+    it. Times are resolved with mktime, so DST days come out right. Timers
+    run on the monotonic clock, so the tray calls resync() when a ClockWatch
+    reports a clock jump or resume. A manual change pauses the schedule until
+    the next point starts ramping.
+    """
+
+    def __init__(self, config, apply, scheduler=None, cancel=None, clock=time.time):
+        self.config = config
+        self.apply = apply
+        self.scheduler = scheduler
+        self.cancel_timer = cancel
+        self.clock = clock
+        self.applied = None
+        self.paused_until = None
+        self.wakeups = 0
+        self._timer = None
+
+    def knots(self, now):
+        """Return [(time, percent, ramp_start)] covering yesterday to tomorrow"""
+        points = parse_schedule(self.config.get('schedule'))
+        if not points:
+            return []
+        ramp = max(0, self.config.get('schedule_ramp_minutes', 30)) * 60
+        day = time.localtime(now)
+        knots = []
+        for offset in (-1, 0, 1):
+            for index, (seconds, value) in enumerate(points):
+                at = time.mktime((day.tm_year, day.tm_mon, day.tm_mday + offset,
+                                  seconds // 3600, seconds % 3600 // 60, 0, 0, 0, -1))
+                previous_seconds, previous_value = points[index - 1]
+                gap = (seconds - previous_seconds) % 86400 or 86400
+                start = at - min(ramp, gap)
+                knots.append((start, previous_value, True))
+                knots.append((at, value, False))
+        return knots
+
+    def target_at(self, now):
+        """Return the scheduled percentage at wall-clock time now, or None"""
+        knots = self.knots(now)
+        for (t0, v0, _), (t1, v1, _) in zip(knots, knots[1:]):
+            if t0 <= now < t1:
+                return int(v0 + (v1 - v0) * (now - t0) / (t1 - t0) + 0.5)
+        return None
+
+    def next_change(self, now):
+        """Return the wall-clock time at which target_at() next changes, or None"""
+        knots = self.knots(now)
+        for (t0, v0, _), (t1, v1, _) in zip(knots, knots[1:]):
+            if t1 <= now or v0 == v1:
+                continue
+            if now < t0:
+                return t0
+            # Inside a ramp: find where the rounded value crosses the next half step
+            current = int(v0 + (v1 - v0) * (now - t0) / (t1 - t0) + 0.5)
+            boundary = current + 0.5 if v1 > v0 else current - 0.5
+            return min(t1, t0 + (boundary - v0) / (v1 - v0) * (t1 - t0))
+        return knots[-1][0] if knots else None
+
+    def next_point(self, now):
+        """Return the time the next schedule point starts ramping"""
+        starts = [t for t, value, ramp_start in self.knots(now) if ramp_start and t > now]
+        return starts[0] if starts else None
+
+    def note_manual(self, value):
+        """Pause the schedule until the next point after a manual change"""
+        if not self.running:
+            return
+        self.paused_until = self.next_point(self.clock())
+        self.applied = value
+        self._arm(self.paused_until)
+
+    def sync(self):
+        """Apply the current target and arm the timer for the next change"""
+        now = self.clock()
+        if self.paused_until is not None and now < self.paused_until:
+            self._arm(self.paused_until)
+            return
+        self.paused_until = None
+        target = self.target_at(now)
+        if target is not None and target != self.applied:
+            self.applied = target
+            self.apply(target)
+        self._arm(self.next_change(now))
+
+    def resync(self):
+        """Re-evaluate after a clock jump or resume from suspend
+
+        The backlight may have been reset while suspended, so the current
+        target is applied again even if it equals the last one. The tray
+        invalidates its worker first so that write is not skipped as redundant.
+        """
+        if self.running:
+            self.applied = None
+            self.sync()
+
+    def _arm(self, at):
+        self.stop()
+        if at is None or self.scheduler is None:
+            return
+        # One millisecond late so the timer lands past the boundary it waits for
+        delay_ms = max(0, int((at - self.clock()) * 1000) + 1)
+        self._timer = self.scheduler(delay_ms, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self.wakeups += 1
+        self.sync()
+        return False
+
+    def start(self):
+        """Apply the schedule now and keep following it"""
+        self.applied = None
+        self.paused_until = None
+        self.sync()
+
+    @property
+    def running(self):
+        return self._timer is not None
+
+    def stop(self):
+        """Cancel the pending timer"""
+        if self._timer is not None and self.cancel_timer is not None:
+            self.cancel_timer(self._timer)
+        self._timer = None
+
+class IdleDimmer:
+    """Dim the backlight while the session is idle and restore it on activity
+
+    The tray feeds set_idle() from logind's IdleHint property, so there is no
+    idle-time polling. Dimming and restoring are one apply() call each. A
+    manual change while dimmed replaces the restore, and last_brightness is
+    left untouched so the restore always returns to the user's own level.
+    """
+
+    def __init__(self, config, apply):
+        self.config = config
+        self.apply = apply
+        self.idle = False
+        self.dimmed = False
+        self.dims = 0
+
+    def set_idle(self, idle):
+        """Dim on idle, restore on activity; return True if brightness was changed"""
+        idle = bool(idle)
+        if idle == self.idle:
+            return False
+        self.idle = idle
+        if idle:
+            level = self.config.get('idle_dim_level', 10)
+            if self.config.get('last_brightness', 50) <= level:
+                return False
+            self.dimmed = True
+            self.dims += 1
+            self.apply(level)
+            return True
+        if not self.dimmed:
+            return False
+        self.dimmed = False
+        self.apply(self.config.get('last_brightness', 50))
+        return True
+
+    def note_manual(self, value):
+        """Cancel the pending restore after a manual change"""
+        self.dimmed = False
@@ -0,0 +1,1524 @@
+"""
+Lenovo Legion Brightness Control - Core
+Configuration, brightness controller and hardware backends.
+This module does not import GTK so it can be reused by non-GUI entry points.
+"""
+
+import os
+import threading
+import time
+import json
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+SYSFS_BACKLIGHT_ROOT = "/sys/class/backlight"
+SYSFS_LEDS_ROOT = "/sys/class/leds"
+IIO_ROOT = "/sys/bus/iio/devices"
+SYSFS_POWER_SUPPLY_ROOT = "/sys/class/power_supply"
+DEFAULT_DEVICE = "intel_backlight"
+HELPER_SOCKET = "/run/legion-brightness/helper.sock"
+PRESETS = [100, 80, 67, 50, 40, 20]
+ROUTES = ("sysfs", "helper", "subprocess")  # fastest first
+
+SAVE_DELAY_MS = 2000
+SCROLL_INTERVAL_MS = 100  # minimum spacing of targets sent while scrolling on the tray icon
+CURVE_STEPS = 1000  # lookup table resolution: 0.1% of the slider
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+class BrightnessMetrics:
+    """In-memory latency histograms and counters for brightness operations
+
+    Everything lives in fixed-size structures: one bucket array per
+    (operation, backend) pair, outcome counters, named event counters and a
+    short ring buffer of recent errors. Recording is a clock read, a
+    bisect and a few increments under a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.outcomes = {}
+        self.events = {}
+        self.errors = deque(maxlen=20)
+
+    def record(self, operation, backend, success, started, error=None):
+        """Record one operation that began at time.perf_counter() value started"""
+        elapsed = time.perf_counter() - started
+        outcome = "success" if success else ("timeout" if error == "timeout" else "failure")
+        key = (operation, backend)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            histogram[0][bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            histogram[1] += elapsed
+            self.outcomes[key + (outcome,)] = self.outcomes.get(key + (outcome,), 0) + 1
+            if not success:
+                self.errors.append((time.time(), operation, backend, error or outcome))
+
+    def count(self, event, amount=1):
+        """Increment a named event counter"""
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + amount
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serializable dict"""
+        with self._lock:
+            operations = {}
+            for (operation, backend), (buckets, total) in self.histograms.items():
+                count = sum(buckets)
+                operations[f"{operation}/{backend}"] = {
+                    "count": count,
+                    "mean_ms": round(total / count * 1000, 4) if count else 0,
+                    "p50_ms": self._quantile(buckets, 0.50),
+                    "p99_ms": self._quantile(buckets, 0.99),
+                    "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"],
+                                        buckets)),
+                    "success": self.outcomes.get((operation, backend, "success"), 0),
+                    "failure": self.outcomes.get((operation, backend, "failure"), 0),
+                    "timeout": self.outcomes.get((operation, backend, "timeout"), 0),
+                }
+            return {
+                "operations": operations,
+                "events": dict(self.events),
+                "recent_errors": [{"time": when, "operation": operation, "backend": backend,
+                                   "error": error}
+                                  for when, operation, backend, error in self.errors],
+            }
+
+    @staticmethod
+    def _quantile(buckets, fraction):
+        """Upper bucket bound (ms) containing the given quantile"""
+        target = fraction * sum(buckets)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (None,), buckets):
+            seen += count
+            if count and seen >= target:
+                return None if bound is None else bound * 1000
+        return None
+
+    def to_json(self):
+        """Export metrics as JSON text"""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Export metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP legion_brightness_operation_seconds Latency of brightness operations",
+            "# TYPE legion_brightness_operation_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {key: (list(buckets), total) for key, (buckets, total) in self.histograms.items()}
+            outcomes = dict(self.outcomes)
+            events = dict(self.events)
+        for (operation, backend), (buckets, total) in sorted(histograms.items()):
+            labels = f'operation="{operation}",backend="{backend}"'
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], buckets):
+                cumulative += count
+                lines.append(f'legion_brightness_operation_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"legion_brightness_operation_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"legion_brightness_operation_seconds_count{{{labels}}} {cumulative}")
+        lines += [
+            "# HELP legion_brightness_operations_total Brightness operations by outcome",
+            "# TYPE legion_brightness_operations_total counter",
+        ]
+        for (operation, backend, outcome), count in sorted(outcomes.items()):
+            lines.append(f'legion_brightness_operations_total{{operation="{operation}",'
+                         f'backend="{backend}",outcome="{outcome}"}} {count}')
+        lines += [
+            "# HELP legion_brightness_events_total Coalesced and skipped writes, transitions and config flushes",
+            "# TYPE legion_brightness_events_total counter",
+        ]
+        for event, count in sorted(events.items()):
+            lines.append(f'legion_brightness_events_total{{event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path, prometheus=False):
+        """Write metrics to a file atomically (safe for a Prometheus textfile collector)"""
+        from pathlib import Path  # deferred: brightness_restore.py never exports metrics
+        path = Path(path)
+        tmp_file = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(self.to_prometheus() if prometheus else self.to_json())
+        os.replace(tmp_file, path)
+        return path
+
+# Process-wide metrics shared by the controller, worker and config
+metrics = BrightnessMetrics()
+
+DEFAULT_CONFIG = {
+    "intel_max": 496,
+    "use_pkexec": False,
+    "last_brightness": 50,
+    "scroll_step": 5,
+    "indicator_label": True,
+    "power_profiles_enabled": False,
+    "power_source": None,
+    "power_profiles": {
+        "ac": {"brightness": None, "max": 100},
+        "battery": {"brightness": None, "max": 100}
+    },
+    "power_supply_root": SYSFS_POWER_SUPPLY_ROOT,
+    "idle_dim_enabled": False,
+    "idle_dim_level": 10,
+    "idle_bus": "system",
+    "schedule_enabled": False,
+    "schedule": [["07:00", 100], ["22:00", 40]],
+    "schedule_ramp_minutes": 30,
+    "backend": "auto",
+    "backend_routes": {},
+    "sysfs_root": SYSFS_BACKLIGHT_ROOT,
+    "devices": [DEFAULT_DEVICE],
+    "keyboard_backlight": False,
+    "leds_root": SYSFS_LEDS_ROOT,
+    "curve": "linear",
+    "curve_gamma": 2.2,
+    "helper_socket": HELPER_SOCKET,
+    "transition_ms": 250,
+    "transition_easing": "ease-out",
+    "transition_max_fps": 30,
+    "auto_brightness": False,
+    "iio_root": IIO_ROOT,
+    "als_min_lux": 1.0,
+    "als_max_lux": 1000.0,
+    "als_min_brightness": 10,
+    "als_max_brightness": 100,
+    "als_hysteresis": 5
+}
+
+# Allowed ranges and values; anything else keeps the previous (or default) value
+SETTING_RANGES = {
+    "intel_max": (1, None),
+    "last_brightness": (0, 100),
+    "scroll_step": (1, 100),
+    "idle_dim_level": (0, 100),
+    "schedule_ramp_minutes": (0, 24 * 60),
+    "curve_gamma": (0.1, 10),
+    "transition_ms": (0, 10000),
+    "transition_max_fps": (1, 240),
+    "als_min_lux": (0, None),
+    "als_max_lux": (0, None),
+    "als_min_brightness": (0, 100),
+    "als_max_brightness": (0, 100),
+    "als_hysteresis": (0, 100),
+}
+SETTING_CHOICES = {
+    "curve": ("linear", "gamma", "logarithmic"),
+    "idle_bus": ("system", "session"),
+    "power_source": (None, "ac", "battery"),
+}
+
+def valid_percent(value, low=0):
+    """Whole percentage from low to 100"""
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= 100
+
+def valid_power_profiles(value):
+    """{"ac"|"battery": {"brightness": percent or null, "max": 1-100 or null}}"""
+    return isinstance(value, dict) and all(
+        source in ("ac", "battery") and isinstance(profile, dict)
+        and set(profile) <= {"brightness", "max"}
+        and (profile.get('brightness') is None or valid_percent(profile['brightness']))
+        and (profile.get('max') is None or valid_percent(profile['max'], 1))
+        for source, profile in value.items())
+
+def valid_schedule(value):
+    """[["HH:MM", percent], ...]"""
+    if not isinstance(value, list):
+        return False
+    for point in value:
+        if not isinstance(point, list) or len(point) != 2 or not isinstance(point[0], str) \
+                or not valid_percent(point[1]):
+            return False
+        hours, _, minutes = point[0].partition(":")
+        if not (hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60):
+            return False
+    return True
+
+def valid_devices(value):
+    """List of device names"""
+    return isinstance(value, list) and all(isinstance(name, str) and name for name in value)
+
+def valid_routes(value):
+    """{device name: one of ROUTES}"""
+    return isinstance(value, dict) and all(isinstance(name, str) and route in ROUTES
+                                           for name, route in value.items())
+
+# Settings with nested values are checked as a whole, like the scalar ones
+SETTING_CHECKS = {
+    "power_profiles": valid_power_profiles,
+    "schedule": valid_schedule,
+    "devices": valid_devices,
+    "backend_routes": valid_routes,
+}
+
+class BrightnessSettings:
+    """Validated, typed snapshot of config.json
+
+    There is one slot per key in DEFAULT_CONFIG. A value of the wrong type
+    (a float where the default is an int), outside SETTING_RANGES, not in
+    SETTING_CHOICES or failing its SETTING_CHECKS shape keeps the fallback value
+    (the current config on reload, the default otherwise) and its key is
+    listed in `errors`. Unknown keys are kept in `extra` so saving never
+    drops them.
+    """
+    __slots__ = tuple(DEFAULT_CONFIG) + ("extra", "errors")
+
+    def __init__(self, data=None, fallback=None):
+        import copy  # deferred, like select and socket: brightness_restore.py never builds settings
+        data = data or {}
+        fallback = fallback or DEFAULT_CONFIG
+        self.errors = []
+        self.extra = {key: value for key, value in data.items() if key not in DEFAULT_CONFIG}
+        for key, default in DEFAULT_CONFIG.items():
+            value = data.get(key, default)
+            if key in data and not self.valid(key, value):
+                self.errors.append(key)
+                value = fallback.get(key, default)
+            setattr(self, key, copy.deepcopy(value))
+
+    @staticmethod
+    def valid(key, value):
+        """Check one value against the type of its default and its limits"""
+        default = DEFAULT_CONFIG[key]
+        if key in SETTING_CHOICES:
+            return value in SETTING_CHOICES[key]
+        if key in SETTING_CHECKS:
+            return SETTING_CHECKS[key](value)
+        if isinstance(default, bool):
+            return isinstance(value, bool)
+        if isinstance(default, (int, float)):
+            numbers = int if isinstance(default, int) else (int, float)
+            if isinstance(value, bool) or not isinstance(value, numbers):
+                return False
+            low, high = SETTING_RANGES.get(key, (None, None))
+            return (low is None or value >= low) and (high is None or value <= high)
+        return isinstance(value, type(default))
+
+    def as_dict(self):
+        """Plain dict in the shape config.json uses"""
+        config = {key: getattr(self, key) for key in DEFAULT_CONFIG}
+        config.update(self.extra)
+        return config
+
+    def changes(self, config):
+        """Keys whose value differs from a config dict"""
+        return {key for key in DEFAULT_CONFIG if config.get(key) != getattr(self, key)}
+
+class BrightnessConfig:
+    """Handle configuration loading and saving
+
+    Changes can be batched with schedule_save(): the file is marked dirty
+    and written once after SAVE_DELAY_MS, or earlier by flush(). Writes go
+    to a temporary file that is renamed over config.json, so a crash never
+    leaves a half-written config, and are skipped when nothing changed.
+
+    Edits made by other programs are picked up with watch()/handle(): the
+    file is only re-read when its inode, mtime or size moved, validated into
+    BrightnessSettings and applied to `config` in place, so everything
+    holding the dict sees the new values.
+    """
+    def __init__(self, config_file=None, scheduler=None):
+        from pathlib import Path  # deferred: brightness_restore.py reads config.json itself
+        self.config_file = Path(config_file) if config_file else \
+            Path.home() / ".config" / "legion-brightness" / "config.json"
+        # scheduler(delay_ms, callback) runs callback later, e.g. GLib.timeout_add
+        self.scheduler = scheduler
+        self.dirty = False
+        self.save_pending = False
+        self.writes = 0
+        self.reloads = 0
+        self.load_failed = False
+        self._saved = None
+        self._stamp = None
+        self._watch_fd = None
+        self.settings = BrightnessSettings()
+        self.config = self.load_config()
+
+    def load_config(self):
+        """Load configuration from file or create default"""
+        self.config_file.parent.mkdir(parents=True, exist_ok=True)
+
+
+        if self.config_file.exists():
+            started = time.perf_counter()
+            try:
+                self._stamp = self._stat()
+                with open(self.config_file, 'r') as f:
+                    self.settings = BrightnessSettings(json.load(f))
+                    config = self.settings.as_dict()
+                    self._saved = json.dumps(config, indent=2)
+                    metrics.record("config_load", "file", True, started)
+                    return config
+            except Exception as e:
+                metrics.record("config_load", "file", False, started, str(e))
+                self.load_failed = True
+                return self.settings.as_dict()
+        else:
+            self.save_config(self.settings.as_dict())
+            return self.config
+
+    def save_config(self, config=None):
+        """Save configuration to file now, skipping the write if nothing changed
+
+        dirty stays set when the write fails, so the next flush tries again.
+        """
+        if config:
+            self.config = config
+        started = time.perf_counter()
+        tmp_file = None
+        try:
+            data = json.dumps(self.config, indent=2)
+            if data == self._saved:
+                self.dirty = False
+                metrics.count("config_saves_skipped")
+                return
+            tmp_file = self.config_file.with_name(f".{self.config_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
+            self.dirty = False
+            self._saved = data
+            self._stamp = self._stat()
+            self.writes += 1
+            metrics.count("config_flushes")
+            metrics.record("config_save", "file", True, started)
+        except Exception as e:
+            metrics.record("config_save", "file", False, started, str(e))
+            if tmp_file is not None:
+                try:
+                    os.unlink(tmp_file)
+                except OSError as e:
+                    pass
+
+    def schedule_save(self):
+        """Mark the config dirty and write it once after SAVE_DELAY_MS"""
+        self.dirty = True
+        if self.scheduler is None:
+            self.save_config()
+        elif not self.save_pending:
+            self.save_pending = True
+            self.scheduler(SAVE_DELAY_MS, self._on_save_timeout)
+
+    def _on_save_timeout(self):
+        self.save_pending = False
+        self.flush()
+        return False
+
+    def flush(self):
+        """Write any pending changes immediately"""
+        if self.dirty:
+            self.save_config()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.config_file)
+        except OSError as e:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _apply(self, settings):
+        """Copy changed values into config in place and return their keys"""
+        changed = settings.changes(self.config)
+        for key in changed:
+            self.config[key] = getattr(settings, key)
+        self.settings = settings
+        return changed
+
+    def reload(self):
+        """Re-read config.json if another program changed it; return the changed keys
+
+        A file that is not valid JSON (a partial write in progress, or a bad
+        hand edit) is ignored and read again on the next change.
+        """
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            metrics.count("config_reloads_skipped")
+            return set()
+        started = time.perf_counter()
+        try:
+            with open(self.config_file, 'r') as f:
+                data = f.read()
+            if data == self._saved:
+                self._stamp = stamp
+                metrics.count("config_reloads_skipped")
+                return set()
+            loaded = json.loads(data)
+            if not isinstance(loaded, dict):
+                raise ValueError("not a JSON object")
+        except (OSError, ValueError) as e:
+            metrics.record("config_reload", "file", False, started, str(e))
+            return set()
+        self._stamp = stamp
+        self.load_failed = False
+        changed = self._apply(BrightnessSettings(loaded, self.config))
+        self._saved = json.dumps(self.config, indent=2)
+        self.reloads += 1
+        metrics.record("config_reload", "file", True, started)
+        return changed
+
+    def update(self, values):
+        """Validate and apply values set in the UI, save, and return the changed keys"""
+        changed = self._apply(BrightnessSettings(dict(self.config, **values), self.config))
+        if changed:
+            self.save_config()
+        return changed
+
+    def watch(self):
+        """Return a non-blocking inotify fd for changes to config.json, or None"""
+        if self._watch_fd is None:
+            # Watch the directory: saves replace the file, so its own watch would go stale
+            self._watch_fd = inotify_watch([self.config_file.parent], IN_CLOSE_WRITE | IN_MOVED_TO)
+        return self._watch_fd
+
+    def handle(self, fd):
+        """Drain the watch fd and reload; return the changed keys"""
+        try:
+            while os.read(fd, 4096):
+                pass
+        except OSError as e:
+            pass
+        return self.reload()
+
+    def close(self):
+        """Stop watching config.json"""
+        if self._watch_fd is not None:
+            os.close(self._watch_fd)
+            self._watch_fd = None
+
+class SubprocessBackend:
+    """Backend that runs brightnessctl through sudo or pkexec, as use_pkexec says"""
+    name = "subprocess"
+
+    def __init__(self, config, device=DEFAULT_DEVICE):
+        self.config = config
+        self.device = device
+        self.last_error = None
+
+    def set_raw(self, value):
+        """Write a raw brightness value, return True on success"""
+        import subprocess  # deferred: only this backend forks processes
+        sudo_cmd = ["pkexec"] if self.config.get('use_pkexec') else ["sudo"]
+
+        try:
+            cmd = sudo_cmd + ["brightnessctl", f"--device={self.device}", "set", str(value)]
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+            if result.returncode != 0:
+                self.last_error = result.stderr.strip() or f"exit status {result.returncode}"
+            return result.returncode == 0
+        except subprocess.TimeoutExpired as e:
+            self.last_error = "timeout"
+            return False
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    def get_raw(self):
+        """Read the raw brightness value, or None on failure"""
+        import subprocess
+        try:
+            result = subprocess.run(["brightnessctl", f"--device={self.device}", "get"],
+                                  capture_output=True, text=True, timeout=5)
+            if result.returncode == 0:
+                return int(result.stdout.strip())
+            self.last_error = result.stderr.strip() or f"exit status {result.returncode}"
+        except subprocess.TimeoutExpired as e:
+            self.last_error = "timeout"
+        except Exception as e:
+            self.last_error = str(e)
+        return None
+
+    def get_max(self):
+        """Read the raw maximum brightness value, or None on failure"""
+        import subprocess
+        try:
+            result = subprocess.run(["brightnessctl", f"--device={self.device}", "max"],
+                                  capture_output=True, text=True, timeout=5)
+            if result.returncode == 0:
+                return int(result.stdout.strip())
+        except Exception as e:
+            pass
+        return None
+
+    def close(self):
+        """Nothing to release for the subprocess backend"""
+        pass
+
+class SysfsBackend:
+    """Backend that writes /sys/class/backlight/<device>/brightness in-process
+
+    The brightness attribute is opened once and kept open, so a change costs a
+    single write() instead of a sudo + brightnessctl fork. The root directory
+    can point at a fake tree for testing.
+    """
+    name = "sysfs"
+
+    def __init__(self, device=DEFAULT_DEVICE, root=SYSFS_BACKLIGHT_ROOT):
+        self.device = device
+        self.path = os.path.join(root, device)
+        self._write_fd = None
+        self._read_fd = None
+        self._max = None
+        self.last_error = None
+
+    def is_available(self):
+        """Check that the device exists and its brightness attribute is writable"""
+        return os.access(os.path.join(self.path, "brightness"), os.W_OK)
+
+    def _open_write(self):
+        if self._write_fd is None:
+            # A symlinked attribute in a planted tree must not redirect a root write
+            self._write_fd = os.open(os.path.join(self.path, "brightness"), os.O_WRONLY | os.O_NOFOLLOW)
+        return self._write_fd
+
+    def _open_read(self):
+        if self._read_fd is None:
+            actual = os.path.join(self.path, "actual_brightness")
+            if not os.path.exists(actual):
+                actual = os.path.join(self.path, "brightness")
+            self._read_fd = os.open(actual, os.O_RDONLY | os.O_NOFOLLOW)
+        return self._read_fd
+
+    def set_raw(self, value):
+        """Write a raw brightness value, return True on success
+
+        Raises PermissionError when the attribute is not writable so the
+        controller can fall back to the subprocess backend.
+        """
+        data = b"%d\n" % value
+        try:
+            fd = self._open_write()
+            os.pwrite(fd, data, 0)
+        except PermissionError:
+            raise
+        except OSError as e:
+            self.last_error = str(e)
+            self.close()
+            return False
+        try:
+            # Regular files in a fake tree keep stale trailing bytes otherwise
+            os.ftruncate(fd, len(data))
+        except OSError as e:
+            pass
+        return True
+
+    def get_raw(self):
+        """Read the raw brightness value, or None on failure"""
+        try:
+            return int(os.pread(self._open_read(), 32, 0).strip())
+        except (OSError, ValueError) as e:
+            self.last_error = str(e)
+            self.close()
+            return None
+
+    def get_max(self):
+        """Read max_brightness once and cache it"""
+        if self._max is None:
+            try:
+                self._max = int(read_attribute(self.path, "max_brightness"))
+            except (OSError, ValueError) as e:
+                return None
+        return self._max
+
+    def close(self):
+        """Close the kept-open attribute file descriptors"""
+        for fd in (self._write_fd, self._read_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError as e:
+                    pass
+        self._write_fd = None
+        self._read_fd = None
+
+class HelperBackend:
+    """Backend that talks to brightness_helper.py over its Unix socket
+
+    The connection is kept open between requests; see brightness_helper.py
+    for the line protocol.
+    """
+    name = "helper"
+
+    def __init__(self, device=DEFAULT_DEVICE, socket_path=HELPER_SOCKET):
+        self.device = device
+        self.socket_path = str(socket_path)
+        self._sock = None
+        self._reader = None
+        self.last_error = None
+
+    def is_available(self):
+        """Check that the helper socket exists and accepts a connection"""
+        if not os.path.exists(self.socket_path):
+            return False
+        try:
+            self._connect()
+            return True
+        except OSError as e:
+            return False
+
+    def _connect(self):
+        if self._sock is None:
+            import socket  # deferred: keeps brightness_restore.py start-up small
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(5)
+            sock.connect(self.socket_path)
+            self._sock = sock
+            self._reader = sock.makefile('rb')
+        return self._sock
+
+    def request(self, *lines):
+        """Send one or more pipelined requests and return their replies in order"""
+        try:
+            sock = self._connect()
+            sock.sendall("".join(f"{line}\n" for line in lines).encode())
+            replies = []
+            for line in lines:
+                reply = self._reader.readline()
+                if not reply:
+                    raise ConnectionError("helper closed the connection")
+                replies.append(reply.decode().strip())
+            return replies
+        except TimeoutError as e:
+            self.last_error = "timeout"
+            self.close()
+            return None
+        except OSError as e:
+            self.last_error = str(e)
+            self.close()
+            return None
+
+    def _value(self, command):
+        replies = self.request(command)
+        if replies and replies[0].startswith("OK "):
+            return int(replies[0][3:])
+        if replies:
+            self.last_error = replies[0]
+        return None
+
+    def set_raw(self, value):
+        """Write a raw brightness value, return True on success"""
+        return self._value(f"SET {self.device} {value}") is not None
+
+    def get_raw(self):
+        """Read the raw brightness value, or None on failure"""
+        return self._value(f"GET {self.device}")
+
+    def get_max(self):
+        """Read the raw maximum brightness value, or None on failure"""
+        return self._value(f"MAX {self.device}")
+
+    def close(self):
+        """Close the helper connection"""
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError as e:
+                pass
+        self._sock = None
+        self._reader = None
+
+def read_attribute(path, name):
+    """Read one sysfs attribute as stripped text"""
+    with open(os.path.join(path, name), 'r') as f:
+        return f.read().strip()
+
+class BacklightDevice:
+    """Location, kind and max_brightness of one backlight or keyboard LED device
+
+    Write permission is not cached here: each route checks it when it is
+    probed (see probe_route).
+    """
+
+    def __init__(self, name, root, kind="backlight"):
+        self.name = name
+        self.root = os.fspath(root)
+        self.path = os.path.join(self.root, name)
+        self.kind = kind
+        self.max = None
+        self.refresh()
+
+    def refresh(self):
+        """Re-read max_brightness"""
+        try:
+            self.max = int(read_attribute(self.path, "max_brightness"))
+        except (OSError, ValueError) as e:
+            self.max = None
+
+    def __repr__(self):
+        return f"BacklightDevice({self.name!r}, kind={self.kind!r}, max={self.max})"
+
+def discover_devices(root=SYSFS_BACKLIGHT_ROOT, leds_root=None):
+    """List every backlight device, plus keyboard backlight LEDs if leds_root is given"""
+    devices = []
+    try:
+        for name in sorted(os.listdir(root)):
+            if os.path.exists(os.path.join(root, name, "brightness")):
+                devices.append(BacklightDevice(name, root))
+    except OSError as e:
+        pass
+    if leds_root:
+        try:
+            for name in sorted(os.listdir(leds_root)):
+                if "kbd_backlight" in name and os.path.exists(os.path.join(leds_root, name, "brightness")):
+                    devices.append(BacklightDevice(name, leds_root, "leds"))
+        except OSError as e:
+            pass
+    return devices
+
+def route_backend(route, config, device=DEFAULT_DEVICE, root=None):
+    """Build the backend for a route name from ROUTES"""
+    if route == "sysfs":
+        return SysfsBackend(device, root or config.get('sysfs_root', SYSFS_BACKLIGHT_ROOT))
+    if route == "helper":
+        return HelperBackend(device, config.get('helper_socket', HELPER_SOCKET))
+    return SubprocessBackend(config, device)
+
+def probe_route(config, device=DEFAULT_DEVICE, root=None, kind="backlight", skip=()):
+    """Return the fastest route that works for a device: sysfs > helper > subprocess
+
+    sysfs and helper are checked in-process, without forking. subprocess is
+    the fallback when neither works; use_pkexec picks sudo or pkexec for it
+    at write time. The helper only serves backlight devices, not keyboard LEDs.
+    """
+    for route in ROUTES[:-1]:
+        if route in skip or (route == "helper" and kind != "backlight"):
+            continue
+        if route_backend(route, config, device, root).is_available():
+            return route
+    return "subprocess"
+
+def select_backend(config, device=DEFAULT_DEVICE, root=None, kind="backlight"):
+    """Pick the backend named in the config
+
+    'auto' uses the route cached in config['backend_routes'] and only probes
+    (see probe_route) for devices that have none yet.
+    """
+    choice = config.get('backend', 'auto')
+    root = root or config.get('sysfs_root', SYSFS_BACKLIGHT_ROOT)
+
+    if choice == 'auto':
+        routes = config.setdefault('backend_routes', {})
+        route = routes.get(device)
+        if route not in ROUTES or (route == "helper" and kind != "backlight"):
+            route = routes[device] = probe_route(config, device, root, kind)
+        return route_backend(route, config, device, root)
+    if choice == 'sysfs':
+        return SysfsBackend(device, root)
+    if choice == 'helper' and kind == "backlight":
+        return HelperBackend(device, config.get('helper_socket', HELPER_SOCKET))
+    return SubprocessBackend(config, device)
+
+class BrightnessCurve:
+    """Precomputed slider-position to raw-value table for one device
+
+    'linear' reproduces the original int(percent / 100 * max) mapping.
+    'gamma' and 'logarithmic' spend more of the slider on the dim end and
+    never map a non-zero position to 0 (backlight off). Reads are mapped
+    back with a binary search over the same table, to the whole percentage
+    that writes the same raw value again.
+    """
+
+    def __init__(self, max_raw, kind="linear", gamma=2.2):
+        self.key = (max_raw, kind, gamma)
+        if kind == "gamma":
+            shape = lambda p: p ** gamma
+        elif kind == "logarithmic":
+            shape = lambda p: (100 ** p - 1) / 99
+        else:
+            shape = None
+
+        self.table = []
+        for i in range(CURVE_STEPS + 1):
+            if shape is None:
+                raw = i * max_raw // CURVE_STEPS
+            else:
+                raw = min(max_raw, round(shape(i / CURVE_STEPS) * max_raw))
+                if i > 0:
+                    raw = max(1, raw)
+            self.table.append(raw)
+
+    def to_raw(self, percentage):
+        """Raw value for a slider percentage (0-100, fractions allowed)"""
+        index = round(percentage * CURVE_STEPS / 100)
+        return self.table[min(CURVE_STEPS, max(0, index))]
+
+    def to_percent(self, raw):
+        """Whole slider percentage nearest to raw, preferring one whose to_raw() is raw"""
+        step = CURVE_STEPS // 100
+        first, last = bisect_left(self.table, raw), bisect_right(self.table, raw) - 1
+        if last < first:
+            # raw is between two table entries (written by another tool)
+            return min(100, round(first / step))
+        percent = round((first + last) / 2 / step)
+        # Clamp into the whole percentages whose table entry is raw, if any
+        low, high = -(-first // step), last // step
+        return min(high, max(low, percent)) if low <= high else percent
+
+# Config keys that change which backends or devices the controller writes to
+BACKEND_KEYS = {"backend", "sysfs_root", "leds_root", "helper_socket"}
+DEVICE_KEYS = {"devices", "keyboard_backlight"}
+
+class BrightnessController:
+    """Handle brightness control operations
+
+    Brightness is applied to every selected device. The first one is the
+    primary device that reads and status reporting use. Each device maps
+    percentages with its own max_brightness. Writes to slow backends run
+    in parallel so hybrid setups stay in sync.
+
+    The last raw value committed to each device is remembered and writes
+    that would not change it are skipped.
+
+    A route probed again after a failed write is reported through
+    on_route_changed(device, route) when it is set, since the write runs on
+    the worker thread; the GUI stores and saves it on the main loop.
+    """
+    def __init__(self, config, backend=None, clock=time.perf_counter):
+        self.config = config
+        self.clock = clock
+        self.devices = {}
+        self.backends = {}
+        self.last_raw = {}
+        self.skipped_writes = 0
+        # Smoothed seconds per hardware write, None until the first one
+        self.write_latency = None
+        self._curves = {}
+        self._pool = None
+        self.on_route_changed = None
+        if backend is not None:
+            self.backends[backend.device] = backend
+        else:
+            self.refresh_devices()
+
+    @property
+    def primary(self):
+        """Name of the device used for reads"""
+        return next(iter(self.backends))
+
+    @property
+    def backend(self):
+        """Backend of the primary device"""
+        return self.backends[self.primary]
+
+    def refresh_devices(self, rebuild=False):
+        """Rediscover devices and keep backends for the selected ones
+
+        rebuild=True replaces every backend, for when the backend settings changed.
+        """
+        root = self.config.get('sysfs_root', SYSFS_BACKLIGHT_ROOT)
+        leds_root = self.config.get('leds_root') if self.config.get('keyboard_backlight') else None
+        found = {device.name: device for device in discover_devices(root, leds_root)}
+
+        selected = [name for name in self.config.get('devices', [DEFAULT_DEVICE]) if name in found]
+        selected += [name for name, device in found.items()
+                     if device.kind == "leds" and name not in selected]
+        if not selected:
+            # Nothing usable found, keep the historical default device
+            selected = [next(iter(found), DEFAULT_DEVICE)]
+
+        # Build new dicts so a write running on the worker thread never sees them change
+        backends = {}
+        for name in selected:
+            backend = None if rebuild else self.backends.get(name)
+            if backend is None:
+                device = found.get(name)
+                backend = select_backend(self.config, name,
+                                         device.root if device else None,
+                                         device.kind if device else "backlight")
+            backends[name] = backend
+        stale = [backend for name, backend in self.backends.items()
+                 if backends.get(name) is not backend]
+        self.devices = {name: found[name] for name in selected if name in found}
+        self.backends = backends
+        for backend in stale:
+            backend.close()
+
+    def reconfigure(self, changed):
+        """Apply changed config keys; curves and use_pkexec are read on every write"""
+        if changed & BACKEND_KEYS:
+            self.refresh_devices(rebuild=True)
+            self.last_raw = {}
+        elif changed & DEVICE_KEYS:
+            self.refresh_devices()
+
+    def max_for(self, name):
+        """Raw maximum of a device, falling back to intel_max from the config"""
+        device = self.devices.get(name)
+        if device is not None and device.max:
+            return device.max
+        return self.config['intel_max']
+
+    def curve_for(self, name):
+        """Lookup table for a device, rebuilt when its max or the curve settings change"""
+        key = (self.max_for(name), self.config.get('curve', 'linear'),
+               self.config.get('curve_gamma', 2.2))
+        curve = self._curves.get(name)
+        if curve is None or curve.key != key:
+            curve = BrightnessCurve(*key)
+            self._curves[name] = curve
+        return curve
+
+    def to_raw(self, percentage, device=None):
+        """Map a brightness percentage to a raw value for a device (primary by default)"""
+        return self.curve_for(device or self.primary).to_raw(percentage)
+
+    def set_brightness(self, percentage):
+        """Set brightness on every selected device"""
+        writes = [(name, self.to_raw(percentage, name)) for name in self.backends]
+        if len(writes) == 1:
+            return self._write(*writes[0])
+
+        # In-process sysfs writes are cheaper than a thread hand-off
+        fast = [write for write in writes if self.backends[write[0]].name == "sysfs"]
+        slow = [write for write in writes if self.backends[write[0]].name != "sysfs"]
+        if len(slow) > 1:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="brightness-fanout")
+            futures = [self._pool.submit(self._write, *write) for write in slow[1:]]
+            slow = slow[:1]
+        else:
+            futures = []
+        results = [self._write(*write) for write in fast + slow]
+        results += [future.result() for future in futures]
+        return all(results)
+
+    def _write(self, name, raw):
+        if self.last_raw.get(name) == raw:
+            self.skipped_writes += 1
+            metrics.count("writes_skipped_redundant")
+            return True
+        backend = self.backends[name]
+        started = time.perf_counter()
+        write_started = self.clock()
+        try:
+            success = backend.set_raw(raw)
+        except PermissionError as e:
+            backend.last_error = str(e)
+            success = False
+        if not success and self.config.get('backend', 'auto') in ('auto', 'sysfs'):
+            # The cached route stopped working, probe for the next best one
+            replacement = self.reprobe(name, backend)
+            if replacement is not None:
+                backend = replacement
+                try:
+                    success = backend.set_raw(raw)
+                except PermissionError as e:
+                    backend.last_error = str(e)
+        elapsed = self.clock() - write_started
+        metrics.record("set", backend.name, success, started, backend.last_error)
+        self.write_latency = elapsed if self.write_latency is None else \
+            0.7 * self.write_latency + 0.3 * elapsed
+        if success:
+            self.last_raw[name] = raw
+        else:
+            self.last_raw.pop(name, None)
+        return success
+
+    def reprobe(self, name, failed):
+        """Replace a device's failed backend with the next working route, or return None"""
+        old = self.config.get('backend_routes', {}).get(name)
+        device = self.devices.get(name)
+        root = device.root if device else None
+        kind = device.kind if device else "backlight"
+        route = probe_route(self.config, name, root, kind, skip=(old,) if old else ())
+        metrics.count("backend_reprobes")
+        if route == old:
+            # Nothing better to fall back to; retrying the same backend would only fail again
+            return None
+        if self.on_route_changed is not None:
+            self.on_route_changed(name, route)
+        else:
+            self.config.setdefault('backend_routes', {})[name] = route
+        failed.close()
+        backend = route_backend(route, self.config, name, root)
+        self.backends[name] = backend
+        return backend
+
+    def get_current_brightness(self):
+        """Get current brightness from the primary device"""
+        backend = self.backend
+        started = time.perf_counter()
+        current = backend.get_raw()
+        metrics.record("get", backend.name, current is not None, started, backend.last_error)
+        if current is not None:
+            return self.to_percent(current)
+        return None
+
+    def to_percent(self, raw, device=None):
+        """Map a raw value from a device (primary by default) back to a percentage"""
+        return self.curve_for(device or self.primary).to_percent(raw)
+
+    def close(self):
+        """Release backend resources"""
+        for backend in self.backends.values():
+            backend.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+EASING_CURVES = {
+    "linear": lambda t: t,
+    "ease-in": lambda t: t * t,
+    "ease-out": lambda t: 1 - (1 - t) * (1 - t),
+    "ease-in-out": lambda t: t * t * (3 - 2 * t),
+}
+
+class BrightnessTransition:
+    """Ramp brightness from the current value to a target
+
+    Steps are paced by the clock rather than counted, so a slow backend
+    (sudo/pkexec) simply issues fewer, larger steps over the same duration.
+    Steps that map to the raw value already written are skipped. Every ramp
+    adds to the transitions, transition_writes and transitions_interrupted
+    metrics, so writes per ramp can be tuned from Diagnostics.
+    """
+
+    def __init__(self, controller, clock=time.monotonic, sleep=time.sleep):
+        self.controller = controller
+        self.clock = clock
+        self.sleep = sleep
+
+    @property
+    def duration(self):
+        return max(0, self.controller.config.get('transition_ms', 250)) / 1000
+
+    def run(self, start, target, interrupted=lambda: False):
+        """Ramp from start to target percent
+
+        Stops early when interrupted() returns True so a new target can take
+        over from the last written value. Returns (success, position) where
+        position is the percentage last written.
+        """
+        config = self.controller.config
+        ease = EASING_CURVES.get(config.get('transition_easing'), EASING_CURVES["ease-out"])
+        frame = 1 / max(1, config.get('transition_max_fps', 30))
+        duration = self.duration
+
+        began = self.clock()
+        last_raw = self.controller.to_raw(start)
+        position = start
+        writes = 0
+        success = True
+        completed = False
+
+        while True:
+            progress = 1.0 if duration <= 0 else min(1.0, (self.clock() - began) / duration)
+            value = start + (target - start) * ease(progress)
+            raw = self.controller.to_raw(value)
+            if raw != last_raw:
+                success = self.controller.set_brightness(value)
+                writes += 1
+                if not success:
+                    break
+                last_raw = raw
+                position = value
+            if progress >= 1.0:
+                position = target
+                completed = True
+                break
+            if interrupted():
+                break
+            self.sleep(frame)
+
+        metrics.count("transitions")
+        metrics.count("transition_writes", writes)
+        if not completed:
+            metrics.count("transitions_interrupted")
+        return success, position
+
+class SliderThrottle:
+    """Deliver slider values with a leading edge, throttling and a trailing edge
+
+    The first value of a drag is delivered at once. Later values are
+    delivered at most once per interval, and the last value always lands
+    when the interval ends. The interval follows the measured backend
+    write latency: about 60 Hz for direct sysfs, slower for sudo/pkexec.
+    scheduler/cancel are GLib.timeout_add/GLib.source_remove in the GUI.
+    """
+    MIN_INTERVAL_MS = 16
+    MAX_INTERVAL_MS = 300
+
+    def __init__(self, deliver, latency=lambda: None, scheduler=None, cancel=None,
+                 clock=time.monotonic, min_interval_ms=MIN_INTERVAL_MS):
+        self.deliver = deliver
+        self.latency = latency
+        self.min_interval_ms = min_interval_ms
+        self.scheduler = scheduler
+        self.cancel_timer = cancel
+        self.clock = clock
+        self.sent = 0
+        self._pending = None
+        self._timer = None
+        self._last_sent = None
+
+    @property
+    def interval_ms(self):
+        """Current throttle interval derived from the backend latency"""
+        latency = self.latency()
+        if latency is None:
+            return self.min_interval_ms
+        return min(max(self.MAX_INTERVAL_MS, self.min_interval_ms),
+                   max(self.min_interval_ms, int(latency * 1500)))
+
+    @property
+    def active(self):
+        """True while a trailing value is waiting for its timer"""
+        return self._timer is not None
+
+    def push(self, value):
+        """Offer a new slider value"""
+        self._pending = value
+        if self._timer is not None:
+            return
+        wait_ms = 0
+        if self._last_sent is not None:
+            wait_ms = self.interval_ms - (self.clock() - self._last_sent) * 1000
+        if wait_ms <= 0 or self.scheduler is None:
+            self._flush()
+        else:
+            self._timer = self.scheduler(max(1, int(wait_ms)), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._flush()
+        return False
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        value = self._pending
+        self._pending = None
+        self._last_sent = self.clock()
+        self.sent += 1
+        self.deliver(value)
+
+    def cancel(self):
+        """Drop any waiting value and its timer"""
+        if self._timer is not None and self.cancel_timer is not None:
+            self.cancel_timer(self._timer)
+        self._timer = None
+        self._pending = None
+
+class BrightnessWorker:
+    """Apply brightness changes on a background thread, latest value wins
+
+    post() never blocks: it drops the value into a one-slot mailbox and
+    returns. If several values arrive while a write is in flight, only the
+    newest one is written next. Completion callbacks are called as
+    callback(value, success) through dispatch, which the GUI sets to
+    GLib.idle_add so they run on the main loop.
+
+    With a transition, each value is reached through a ramp that is
+    retargeted as soon as a newer value is posted, unless it is posted with
+    ramp=False. After invalidate(), the next value starts from a fresh
+    hardware read and is written even if it matches the last one.
+    """
+
+    def __init__(self, controller, dispatch=None, transition=None):
+        self.controller = controller
+        self.dispatch = dispatch or (lambda callback, *args: callback(*args))
+        self.transition = transition
+        self.current = None
+        self.written = 0
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._stale = False
+        self._thread = threading.Thread(target=self._run, name="brightness-writer", daemon=True)
+        self._thread.start()
+
+    def post(self, value, callback=None, ramp=True):
+        """Queue a target brightness percentage, replacing any unsent one"""
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+                metrics.count("writes_coalesced")
+            self._pending = (value, callback, ramp)
+            self._cond.notify()
+
+    def invalidate(self):
+        """Forget what was written, for when the hardware may have been reset (resume)"""
+        with self._cond:
+            self._stale = True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                value, callback, ramp = self._pending
+                self._pending = None
+                self._busy = True
+                stale, self._stale = self._stale, False
+
+            if stale:
+                # Cleared here so a write in flight never races with it
+                self.current = None
+                self.controller.last_raw = {}
+            position = value
+            try:
+                transition = self.transition if ramp else None
+                if transition is not None and self.current is None:
+                    self.current = self.controller.get_current_brightness()
+                if transition is not None and self.current is not None:
+                    success, position = transition.run(self.current, value, self._has_pending)
+                else:
+                    success = self.controller.set_brightness(value)
+            except Exception as e:
+                success = False
+            if success:
+                self.current = position
+
+            with self._cond:
+                self.written += 1
+                interrupted = self._pending is not None and position != value
+            if callback is not None and not interrupted:
+                self.dispatch(callback, value, success)
+            # Only idle once the callback is queued, so wait_idle() covers it too
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _has_pending(self):
+        return self._pending is not None
+
+    @property
+    def busy(self):
+        """True while a value is queued or being written"""
+        return self._busy or self._pending is not None
+
+    def wait_idle(self, timeout=None):
+        """Block until the mailbox is empty and no write is running"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self):
+        """Stop the writer thread after the current write finishes"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+NETLINK_KOBJECT_UEVENT = 15
+CLOCK_REALTIME = 0
+TFD_TIMER_ABSTIME = 1
+TFD_TIMER_CANCEL_ON_SET = 2
+
+def inotify_watch(paths, mask=IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB):
+    """Return a non-blocking inotify fd watching paths, or None if unavailable"""
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError) as e:
+        return None
+    if fd < 0:
+        return None
+    watched = 0
+    for path in paths:
+        if libc.inotify_add_watch(fd, os.fsencode(path), mask) >= 0:
+            watched += 1
+    if not watched:
+        os.close(fd)
+        return None
+    return fd
+
+def uevent_socket():
+    """Return a non-blocking kernel uevent netlink socket, or None if unavailable"""
+    import socket
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        sock.bind((0, 1))
+        sock.setblocking(False)
+        return sock
+    except (OSError, AttributeError) as e:
+        return None
+
+class ClockWatch:
+    """Become readable when the wall clock jumps, without any timer firing
+
+    A CLOCK_REALTIME timerfd armed far in the future with
+    TFD_TIMER_CANCEL_ON_SET is cancelled by the kernel whenever the clock is
+    set (date, NTP steps) and on resume from suspend, which is exactly when
+    monotonic GLib timers armed for wall-clock times go stale.
+    """
+
+    def __init__(self):
+        self.fd = None
+        self._libc = None
+
+    def start(self):
+        """Create and arm the timerfd; return its fd, or None if unavailable"""
+        try:
+            import ctypes
+            self._libc = ctypes.CDLL(None, use_errno=True)
+            fd = self._libc.timerfd_create(CLOCK_REALTIME, os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            return None
+        if fd < 0:
+            return None
+        self.fd = fd
+        if not self._arm():
+            self.close()
+        return self.fd
+
+    def _arm(self):
+        import ctypes
+        # struct itimerspec: interval {0, 0}, value {far future, 0}
+        spec = (ctypes.c_long * 4)(0, 0, 2 ** 31 - 1, 0)
+        return self._libc.timerfd_settime(self.fd, TFD_TIMER_ABSTIME | TFD_TIMER_CANCEL_ON_SET,
+                                          spec, None) == 0
+
+    def handle(self):
+        """Consume a notification and re-arm; return True if the clock jumped"""
+        try:
+            os.read(self.fd, 8)
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            # ECANCELED: the clock was set or the system resumed
+            self._arm()
+            return True
+        return False
+
+    def close(self):
+        """Close the timerfd"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class BrightnessMonitor:
+    """Keep an in-memory copy of the current brightness, updated by events
+
+    Three event sources are watched, none of them polled on a timer:
+    POLLPRI on actual_brightness (raised by the kernel on every backlight
+    change, including hotkeys and resume), kernel uevents for the backlight
+    subsystem, and inotify on the attributes so fake trees work in tests.
+    Readers use `current` (percent) or `raw` without touching the hardware.
+    Backlight or LED devices appearing or disappearing call on_devices_changed,
+    and power_supply uevents (AC plugged or unplugged) call on_power_changed.
+    """
+
+    def __init__(self, controller, device=DEFAULT_DEVICE, root=SYSFS_BACKLIGHT_ROOT,
+                 on_change=None, on_devices_changed=None, on_power_changed=None):
+        self.controller = controller
+        self.reader = SysfsBackend(device, root)
+        self.on_change = on_change
+        self.on_devices_changed = on_devices_changed
+        self.on_power_changed = on_power_changed
+        self.raw = None
+        self.current = None
+        self._inotify_fd = None
+        self._uevent = None
+        self._watches = []
+
+    def start(self):
+        """Open the event sources and return [(fd, kind)] to watch
+
+        kind is 'pri' for fds that signal with POLLPRI/POLLERR and 'in' for
+        fds that become readable.
+        """
+        self.refresh()
+        self._watches = []
+        try:
+            self._watches.append((self.reader._open_read(), "pri"))
+        except OSError as e:
+            pass
+        self._inotify_fd = inotify_watch([os.path.join(self.reader.path, "brightness"),
+                                          os.path.join(self.reader.path, "actual_brightness")])
+        if self._inotify_fd is not None:
+            self._watches.append((self._inotify_fd, "in"))
+        self._uevent = uevent_socket()
+        if self._uevent is not None:
+            self._watches.append((self._uevent.fileno(), "in"))
+        return self.watches()
+
+    def watches(self):
+        """Return the [(fd, kind)] to watch now
+
+        The reader closes its fd when a read fails and reopens it on the next
+        refresh, so the 'pri' entry follows it and is missing while closed.
+        Callers re-sync their watches after handle() instead of polling a
+        closed fd.
+        """
+        watches = [(fd, kind) for fd, kind in self._watches if kind != "pri"]
+        if self.reader._read_fd is not None:
+            watches.insert(0, (self.reader._read_fd, "pri"))
+        return watches
+
+    def handle(self, fd):
+        """Drain an event source that fired and refresh the cached value"""
+        if fd == self._inotify_fd:
+            self._drain(lambda: os.read(fd, 4096))
+        elif self._uevent is not None and fd == self._uevent.fileno():
+            messages = self._drain(lambda: self._uevent.recv(8192))
+            hotplug = [message for message in messages
+                       if message.startswith((b"add@", b"remove@"))
+                       and (b"SUBSYSTEM=backlight" in message or b"SUBSYSTEM=leds" in message)]
+            if hotplug and self.on_devices_changed is not None:
+                self.on_devices_changed()
+            if self.on_power_changed is not None and \
+                    any(b"SUBSYSTEM=power_supply" in message for message in messages):
+                self.on_power_changed()
+            if not any(b"SUBSYSTEM=backlight" in message for message in messages):
+                return
+        self.refresh()
+
+    @staticmethod
+    def _drain(read):
+        chunks = []
+        try:
+            while True:
+                chunk = read()
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except OSError as e:
+            pass
+        return chunks
+
+    def refresh(self):
+        """Re-read the attribute and notify on_change if the value moved"""
+        raw = self.reader.get_raw()
+        if raw is None or raw == self.raw:
+            return self.current
+        self.raw = raw
+        # Changes made outside the controller invalidate its redundant-write check
+        self.controller.last_raw[self.reader.device] = raw
+        self.current = self.controller.to_percent(raw)
+        if self.on_change is not None:
+            self.on_change(self.current)
+        return self.current
+
+    def poll(self, timeout=None):
+        """Wait for and handle events without a main loop; return True if any fired"""
+        import select
+        poller = select.poll()
+        for fd, kind in self.watches():
+            poller.register(fd, select.POLLPRI | select.POLLERR if kind == "pri" else select.POLLIN)
+        events = poller.poll(None if timeout is None else timeout * 1000)
+        for fd, mask in events:
+            self.handle(fd)
+        return bool(events)
+
+    def close(self):
+        """Close every event source"""
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._uevent is not None:
+            self._uevent.close()
+            self._uevent = None
+        self.reader.close()
+        self._watches = []
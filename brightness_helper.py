@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Privileged Helper
+Long-lived helper that owns the backlight sysfs attributes and serves
+brightness requests over a Unix domain socket, so the applet does not pay
+for a sudo/pkexec process on every change.
+
+Protocol (one request per line, replies in request order, pipelining allowed):
+    SET <device> <value>  ->  OK <value>  |  ERR <reason>
+    GET <device>          ->  OK <value>  |  ERR <reason>
+    MAX <device>          ->  OK <value>  |  ERR <reason>
+"""
+
+import argparse
+import os
+import pwd
+import re
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from pathlib import Path
+
+from brightness_core import SysfsBackend, SYSFS_BACKLIGHT_ROOT, HELPER_SOCKET
+
+DEVICE_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]+$")
+MAX_LINE = 128
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server holding one SysfsBackend per backlight device"""
+    daemon_threads = True
+
+    def __init__(self, socket_path, sysfs_root, allowed_uids):
+        self.sysfs_root = Path(sysfs_root)
+        self.allowed_uids = allowed_uids
+        self.backends = {}
+        self.backends_lock = threading.Lock()
+        super().__init__(socket_path, HelperHandler)
+
+    def get_backend(self, device):
+        """Return the backend for a real backlight device, or None"""
+        if not DEVICE_PATTERN.match(device) or device in (".", ".."):
+            return None
+        with self.backends_lock:
+            backend = self.backends.get(device)
+            if backend is None:
+                if not (self.sysfs_root / device / "brightness").is_file():
+                    return None
+                backend = SysfsBackend(device, self.sysfs_root)
+                self.backends[device] = backend
+            return backend
+
+    def server_close(self):
+        super().server_close()
+        for backend in self.backends.values():
+            backend.close()
+
+class HelperHandler(socketserver.BaseRequestHandler):
+    """Serve pipelined line requests from one client connection"""
+
+    def handle(self):
+        if self.server.allowed_uids is not None:
+            creds = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                            struct.calcsize("3i"))
+            pid, uid, gid = struct.unpack("3i", creds)
+            if uid not in self.server.allowed_uids:
+                self.request.sendall(b"ERR denied\n")
+                return
+
+        pending = b""
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                break
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            if len(pending) > MAX_LINE:
+                self.request.sendall(b"ERR line too long\n")
+                break
+            # Answer every complete request in this batch with a single send
+            replies = [self.process(line.decode("ascii", "replace").split()) for line in lines]
+            if replies:
+                self.request.sendall("".join(reply + "\n" for reply in replies).encode())
+
+    def process(self, parts):
+        """Execute one request and return the reply line"""
+        if len(parts) < 2:
+            return "ERR bad request"
+        command, device = parts[0].upper(), parts[1]
+        backend = self.server.get_backend(device)
+        if backend is None:
+            return "ERR unknown device"
+
+        if command == "SET" and len(parts) == 3:
+            try:
+                value = int(parts[2])
+            except ValueError:
+                return "ERR bad value"
+            max_value = backend.get_max()
+            if max_value is None or not 0 <= value <= max_value:
+                return "ERR out of range"
+            try:
+                if backend.set_raw(value):
+                    return f"OK {value}"
+            except PermissionError:
+                pass
+            return "ERR write failed"
+        if command == "GET" and len(parts) == 2:
+            value = backend.get_raw()
+            return f"OK {value}" if value is not None else "ERR read failed"
+        if command == "MAX" and len(parts) == 2:
+            value = backend.get_max()
+            return f"OK {value}" if value is not None else "ERR read failed"
+        return "ERR bad request"
+
+def main():
+    parser = argparse.ArgumentParser(description="Legion Brightness privileged helper")
+    parser.add_argument("--socket", help=f"Unix socket path (default: {HELPER_SOCKET})")
+    parser.add_argument("--sysfs-root", default=SYSFS_BACKLIGHT_ROOT,
+                        help="backlight device directory")
+    parser.add_argument("--user", help="user allowed to connect (default: invoking user)")
+    parser.add_argument("--test", action="store_true",
+                        help="run as the current user against a fake sysfs tree")
+    args = parser.parse_args()
+
+    if args.test:
+        if args.sysfs_root == SYSFS_BACKLIGHT_ROOT:
+            print("Error: --test requires --sysfs-root pointing at a fake tree")
+            return 1
+        allowed_uids = {os.getuid()}
+        owner = None
+        runtime_dir = os.getenv("XDG_RUNTIME_DIR", "/tmp")
+        socket_path = Path(args.socket or Path(runtime_dir) / "legion-brightness-helper.sock")
+    else:
+        username = args.user or os.getenv("SUDO_USER") or os.getenv("PKEXEC_UID")
+        if not username:
+            print("Error: pass --user or start the helper through sudo/pkexec")
+            return 1
+        try:
+            owner = pwd.getpwuid(int(username)) if username.isdigit() else pwd.getpwnam(username)
+        except KeyError:
+            print(f"Error: unknown user {username}")
+            return 1
+        allowed_uids = {0, owner.pw_uid}
+        socket_path = Path(args.socket or HELPER_SOCKET)
+
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        socket_path.unlink()
+
+    server = HelperServer(str(socket_path), args.sysfs_root, allowed_uids)
+    os.chmod(socket_path, 0o600)
+    if owner is not None:
+        os.chown(socket_path, owner.pw_uid, owner.pw_gid)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            socket_path.unlink()
+        except OSError:
+            pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
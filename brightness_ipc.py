@@ -0,0 +1,245 @@
+"""
+Lenovo Legion Brightness Control - Single Instance IPC
+Lets CLI calls (hotkeys, scripts) hand commands to the running tray over a
+per-user Unix socket instead of starting a new GTK process. Imports no GTK.
+
+Protocol (one request per line, one reply per request):
+    SET <percent> | UP <step> | DOWN <step> | GET | PRESET <n> | SHOW | PING
+    ->  OK [<percent>]  |  ERR <reason>
+"""
+
+import os
+import select
+import socket
+import stat
+import sys
+import time
+from pathlib import Path
+
+from brightness_core import PRESETS
+
+APPLET = Path(__file__).parent / "brightness_applet.py"
+
+USAGE = """Usage: brightness_applet.py [COMMAND]
+
+Without a command, start the tray (or show the window of the running one).
+
+Commands:
+  set PERCENT   set brightness to PERCENT
+  up STEP       raise brightness by STEP percent
+  down STEP     lower brightness by STEP percent
+  get           print the current brightness
+  preset N      apply tray preset N (1 = first menu entry)
+"""
+
+def socket_path():
+    """Return the per-user command socket path
+
+    Without XDG_RUNTIME_DIR the socket lives in a private 0700 directory
+    under /tmp rather than at a bare /tmp name another user could take.
+    """
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return str(Path(runtime_dir) / "legion-brightness.sock")
+    return f"/tmp/legion-brightness-{os.getuid()}/command.sock"
+
+def private_dir(path):
+    """Check that path is a real directory owned by this user and closed to others"""
+    try:
+        info = os.lstat(path)
+    except OSError as e:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+def send_command(line, path=None, timeout=2):
+    """Send one command to the running instance, return its reply or None"""
+    path = path or socket_path()
+    # A socket in someone else's directory is not our tray
+    if not private_dir(os.path.dirname(path)):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(line.encode() + b"\n")
+            reply = b""
+            while not reply.endswith(b"\n"):
+                chunk = sock.recv(256)
+                if not chunk:
+                    break
+                reply += chunk
+            return reply.decode().strip() or None
+    except OSError as e:
+        return None
+
+class CommandServer:
+    """Accept command connections and pass each request to a handler
+
+    handler(command, args) runs on the caller's loop and returns the reply
+    line. watch(fd) registers an fd with the main loop (GLib.io_add_watch in
+    the tray); without it, serve() polls the fds directly.
+    """
+
+    def __init__(self, handler, path=None, watch=None):
+        self.handler = handler
+        self.path = path or socket_path()
+        self.watch = watch
+        self.sock = None
+        self.clients = {}
+
+    def start(self):
+        """Bind the socket, replacing a stale one
+
+        Returns False if another instance owns it or it cannot be bound, in
+        which case the caller carries on without IPC.
+        """
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            if not private_dir(directory):
+                print(f"Legion Brightness: {directory} is not a private directory,"
+                      f" not listening for commands", file=sys.stderr)
+                return False
+            if send_command("PING", self.path) is not None:
+                return False
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            self.sock.listen(8)
+            self.sock.setblocking(False)
+        except OSError as e:
+            print(f"Legion Brightness: cannot listen on {self.path}: {e}", file=sys.stderr)
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+            return False
+        if self.watch is not None:
+            self.watch(self.sock.fileno())
+        return True
+
+    def handle(self, fd):
+        """Service a ready fd; return False once it is closed"""
+        if self.sock is not None and fd == self.sock.fileno():
+            try:
+                client, address = self.sock.accept()
+            except OSError as e:
+                return True
+            client.setblocking(False)
+            self.clients[client.fileno()] = [client, b""]
+            if self.watch is not None:
+                self.watch(client.fileno())
+            return True
+
+        entry = self.clients.get(fd)
+        if entry is None:
+            return False
+        client = entry[0]
+        try:
+            data = client.recv(4096)
+        except BlockingIOError:
+            return True
+        except OSError as e:
+            data = b""
+        if not data:
+            self.drop(fd)
+            return False
+
+        entry[1] += data
+        *lines, entry[1] = entry[1].split(b"\n")
+        replies = []
+        for line in lines:
+            parts = line.decode("ascii", "replace").split()
+            if parts:
+                try:
+                    replies.append(self.handler(parts[0].upper(), parts[1:]))
+                except Exception as e:
+                    replies.append("ERR internal error")
+        try:
+            if replies:
+                client.sendall("".join(reply + "\n" for reply in replies).encode())
+        except OSError as e:
+            self.drop(fd)
+            return False
+        return True
+
+    def drop(self, fd):
+        """Forget and close a client connection"""
+        entry = self.clients.pop(fd, None)
+        if entry is not None:
+            entry[0].close()
+
+    def serve(self, timeout=None):
+        """Handle ready fds once without a main loop; return True if any were ready"""
+        fds = [self.sock.fileno()] + list(self.clients)
+        ready, _, _ = select.select(fds, [], [], timeout)
+        for fd in ready:
+            self.handle(fd)
+        return bool(ready)
+
+    def close(self):
+        """Close every connection and remove the socket"""
+        for fd in list(self.clients):
+            self.drop(fd)
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                pass
+
+def parse_command(argv):
+    """Turn CLI arguments into a protocol line, or None if they are invalid"""
+    command = argv[0].lower()
+    if command == "get" and len(argv) == 1:
+        return "GET"
+    if command in ("set", "up", "down", "preset") and len(argv) == 2:
+        try:
+            value = int(argv[1])
+        except ValueError:
+            return None
+        if command == "preset" and not 1 <= value <= len(PRESETS):
+            return None
+        return f"{command.upper()} {value}"
+    return None
+
+def start_instance(timeout=10):
+    """Start the tray in the background and wait until it accepts commands"""
+    import subprocess  # deferred: only needed when no instance is running
+    subprocess.Popen([sys.executable, str(APPLET)], stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if send_command("PING") is not None:
+            return True
+        time.sleep(0.05)
+    return False
+
+def cli_main(argv):
+    """Run a CLI command against the running tray, starting it if needed"""
+    if argv[0] in ("-h", "--help", "help"):
+        print(USAGE, end="")
+        return 0
+    line = parse_command(argv)
+    if line is None:
+        print(USAGE, end="", file=sys.stderr)
+        return 2
+
+    reply = send_command(line)
+    if reply is None:
+        if not start_instance():
+            print("Error: could not start Legion Brightness", file=sys.stderr)
+            return 1
+        reply = send_command(line)
+
+    if reply is None or not reply.startswith("OK"):
+        print(f"Error: {reply[4:] if reply else 'no reply'}", file=sys.stderr)
+        return 1
+    if line == "GET":
+        print(reply[3:])
+    return 0
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Legion Brightness - Restore
+Writes the saved last_brightness back to the backlight at login and after
+resume. Imports no GTK and does one direct sysfs write per device, falling
+back to the cached helper or subprocess (sudo) route only when sysfs is not
+writable.
+
+Run as a systemd user unit at login (install.sh), and from a system-sleep
+hook after resume (setup_sudoers.py --resume-hook). As root a config owned
+by someone else only picks the level: the real sysfs roots are always used
+and there is no fallback route.
+"""
+
+import json
+import os
+import stat
+import sys
+
+from brightness_core import (BrightnessCurve, BrightnessSettings, SysfsBackend, discover_devices,
+                             route_backend, DEFAULT_CONFIG, DEFAULT_DEVICE, SYSFS_BACKLIGHT_ROOT,
+                             SYSFS_LEDS_ROOT)
+
+def config_path(user=None):
+    """Path of config.json for the given user (default: the current one)"""
+    if user:
+        import pwd
+        home = pwd.getpwnam(user).pw_dir
+    else:
+        home = os.path.expanduser("~")
+    return os.path.join(home, ".config", "legion-brightness", "config.json")
+
+def load_config(path):
+    """Read config.json without creating or filling it; return (config, owner uid)
+
+    The file is opened without following a final symlink and without
+    blocking, and must be a regular file, so a FIFO or a link planted in the
+    user's config directory cannot hang or redirect the root resume hook.
+    Values that fail the applet's BrightnessSettings rules are dropped, so
+    their defaults apply.
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_CLOEXEC)
+    with os.fdopen(fd, 'r') as f:
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode):
+            raise ValueError("not a regular file")
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+    config = {key: value for key, value in data.items()
+              if key not in DEFAULT_CONFIG or BrightnessSettings.valid(key, value)}
+    return config, info.st_uid
+
+def restore_targets(config, trusted=True):
+    """Return (name, root, raw) for every device the tray would write
+
+    trusted=False ignores the sysfs_root/leds_root overrides from the config.
+    """
+    percentage = min(100, max(0, config.get('last_brightness', 50)))
+    root = config.get('sysfs_root', SYSFS_BACKLIGHT_ROOT) if trusted else SYSFS_BACKLIGHT_ROOT
+    leds_root = (config.get('leds_root', SYSFS_LEDS_ROOT) if trusted else SYSFS_LEDS_ROOT) \
+        if config.get('keyboard_backlight') else None
+    found = {device.name: device for device in discover_devices(root, leds_root)}
+
+    selected = [name for name in config.get('devices', [DEFAULT_DEVICE]) if name in found]
+    selected += [name for name, device in found.items()
+                 if device.kind == "leds" and name not in selected]
+    if not selected:
+        selected = [next(iter(found), DEFAULT_DEVICE)]
+
+    targets = []
+    for name in selected:
+        device = found.get(name)
+        max_raw = device.max if device is not None and device.max else config.get('intel_max', 496)
+        curve = BrightnessCurve(max_raw, config.get('curve', 'linear'), config.get('curve_gamma', 2.2))
+        targets.append((name, device.root if device else root, curve.to_raw(percentage)))
+    return targets
+
+def write_raw(config, name, root, raw, fallback=True):
+    """Write one raw value, return the route used or None on failure"""
+    backend = SysfsBackend(name, root)
+    try:
+        if backend.set_raw(raw):
+            return "sysfs"
+    except PermissionError as e:
+        pass
+    finally:
+        backend.close()
+
+    route = config.get('backend_routes', {}).get(name)
+    # pkexec would prompt, which nobody sees at login or resume
+    if not fallback or route not in ("helper", "subprocess") or \
+            (route == "subprocess" and config.get('use_pkexec')):
+        return None
+    backend = route_backend(route, config, name, root)
+    try:
+        return route if backend.set_raw(raw) else None
+    finally:
+        backend.close()
+
+def restore(config, trusted=True):
+    """Restore last_brightness on every device, return {device: route or None}"""
+    return {name: write_raw(config, name, root, raw, trusted)
+            for name, root, raw in restore_targets(config, trusted)}
+
+USAGE = """usage: brightness_restore.py [--config FILE] [--user NAME] [--quiet]
+
+  --config FILE  config.json to read (default: the user's config)
+  --user NAME    restore this user's level (for system-sleep hooks run as root)
+  --quiet        only report failures"""
+
+def parse_args(argv):
+    """Parse the three flags by hand: argparse and getopt cost more than the restore"""
+    options = {}
+    args = iter(argv)
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if name in ("-h", "--help", "--quiet") and not value:
+            options[name] = True
+        elif name in ("--config", "--user"):
+            value = value or next(args, None)
+            if not value:
+                raise ValueError(f"{name} needs a value")
+            options[name] = value
+        else:
+            raise ValueError(f"unknown option {arg}")
+    return options
+
+def main():
+    try:
+        options = parse_args(sys.argv[1:])
+    except ValueError as e:
+        print(f"{e}\n{USAGE}", file=sys.stderr)
+        return 2
+    if "-h" in options or "--help" in options:
+        print(USAGE)
+        return 0
+
+    path = options["--config"] if "--config" in options else config_path(options.get("--user"))
+    try:
+        config, owner = load_config(path)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {path}: {e}", file=sys.stderr)
+        return 1
+
+    results = restore(config, trusted=os.geteuid() != 0 or owner == 0)
+    failed = [name for name, route in results.items() if route is None]
+    for name, route in results.items():
+        if route is None:
+            print(f"Failed to restore {name}", file=sys.stderr)
+        elif "--quiet" not in options:
+            print(f"Restored {name} to {config.get('last_brightness', 50)}% via {route}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
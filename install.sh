@@ -63,6 +63,7 @@ echo ""
 # Make scripts executable
 chmod +x brightness_applet.py
 chmod +x setup_sudoers.py
+chmod +x brightness_helper.py
 
 # Copy icon to local icons directory
 ICON_DIR="$HOME/.local/share/icons/hicolor/scalable/apps"
@@ -98,6 +99,31 @@ echo "✓ Desktop entry created at:"
 echo "  $DESKTOP_FILE"
 echo ""
 
+# Restore the saved brightness at login with a systemd user unit
+chmod +x brightness_restore.py
+RESTORE_UNIT_DIR="$HOME/.config/systemd/user"
+mkdir -p "$RESTORE_UNIT_DIR"
+cat > "$RESTORE_UNIT_DIR/legion-brightness-restore.service" <<EOF
+[Unit]
+Description=Restore Legion Brightness level
+
+[Service]
+Type=oneshot
+ExecStart=/usr/bin/python3 $SCRIPT_DIR/brightness_restore.py --quiet
+
+[Install]
+WantedBy=default.target
+EOF
+
+if command -v systemctl &> /dev/null; then
+    systemctl --user daemon-reload 2>/dev/null || true
+    systemctl --user enable legion-brightness-restore.service 2>/dev/null || true
+fi
+
+echo "✓ Login restore unit installed at:"
+echo "  $RESTORE_UNIT_DIR/legion-brightness-restore.service"
+echo ""
+
 # Update desktop database
 if command -v update-desktop-database &> /dev/null; then
     update-desktop-database "$HOME/.local/share/applications" 2>/dev/null || true
@@ -111,6 +137,9 @@ echo "Next steps:"
 echo ""
 echo "1. Setup sudoers (required for passwordless brightness control):"
 echo "   python3 setup_sudoers.py"
+echo "   (add --udev to let the applet write the backlight directly, without sudo,"
+echo "    --helper to install the privileged helper service,"
+echo "    or --resume-hook to restore the brightness after suspend)"
 echo ""
 echo "2. Launch the applet:"
 echo "   • Run: python3 brightness_applet.py"
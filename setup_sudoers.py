@@ -1,16 +1,28 @@
 #!/usr/bin/env python3
 """
 Legion Brightness - Sudoers Setup Utility
-One-time setup to allow brightnessctl without password prompts
+One-time setup to allow brightnessctl without password prompts. It can
+also install a udev rule that lets the applet write the backlight directly,
+the privileged helper service, and the resume hook. Code that runs as root
+is copied to a root-owned directory first, never run from the user's checkout.
 """
 
+import argparse
 import subprocess
 import os
+import pwd
 import sys
+import tempfile
 from pathlib import Path
 
 SUDOERS_FILE = "/etc/sudoers.d/legion-brightness"
-USERNAME = os.getenv("USER")
+UDEV_RULE_FILE = "/etc/udev/rules.d/90-legion-brightness.rules"
+SYSTEM_LIB_DIR = "/usr/local/lib/legion-brightness"
+HELPER_UNIT_FILE = "/etc/systemd/system/legion-brightness-helper.service"
+SLEEP_HOOK_FILE = "/usr/lib/systemd/system-sleep/legion-brightness"
+BACKLIGHT_GROUP = "video"
+BRIGHTNESS_FILE = "/sys/class/backlight/intel_backlight/brightness"
+USERNAME = os.getenv("USER") or pwd.getpwuid(os.getuid()).pw_name
 
 def check_sudoers_exists():
     """Check if sudoers rule is already configured"""
@@ -26,6 +38,10 @@ def check_sudoers_exists():
             pass
     return False
 
+def test_sysfs_access():
+    """Test if the backlight can already be written directly, without sudo"""
+    return os.access(BRIGHTNESS_FILE, os.W_OK)
+
 def test_sudo_access():
     """Test if brightnessctl already works without password"""
     try:
@@ -46,8 +62,175 @@ def create_sudoers_content():
 {USERNAME} ALL=(ALL) NOPASSWD: /usr/bin/brightnessctl --device=intel_backlight get
 """
 
-def install_sudoers_rule():
-    """Install the sudoers rule with password prompt"""
+def create_udev_rule_content():
+    """Generate the udev rule content"""
+    return f"""# udev rule for Legion Brightness Control
+# Lets members of the {BACKLIGHT_GROUP} group write backlight brightness directly
+ACTION=="add", SUBSYSTEM=="backlight", RUN+="/bin/chgrp {BACKLIGHT_GROUP} /sys%p/brightness", RUN+="/bin/chmod g+w /sys%p/brightness"
+ACTION=="add", SUBSYSTEM=="leds", KERNEL=="*kbd_backlight*", RUN+="/bin/chgrp {BACKLIGHT_GROUP} /sys%p/brightness", RUN+="/bin/chmod g+w /sys%p/brightness"
+"""
+
+def create_helper_unit_content():
+    """Generate the systemd unit for the privileged helper"""
+    return f"""[Unit]
+Description=Legion Brightness privileged helper
+
+[Service]
+ExecStart=/usr/bin/python3 -E -s {SYSTEM_LIB_DIR}/brightness_helper.py --user {USERNAME}
+RuntimeDirectory=legion-brightness
+Restart=on-failure
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+def create_sleep_hook_content():
+    """Generate the system-sleep hook that restores the level after resume"""
+    return f"""#!/bin/sh
+# systemd system-sleep hook for Legion Brightness Control
+# Restores {USERNAME}'s saved level after resume
+case "$1" in
+    post) /usr/bin/python3 -E -s {SYSTEM_LIB_DIR}/brightness_restore.py --user {USERNAME} --quiet ;;
+esac
+"""
+
+def write_temp(content):
+    """Write content to a new private temporary file and return its path
+
+    mkstemp picks an unpredictable name and creates the file 0600 with
+    O_EXCL, so no other user can plant or swap it before root copies it.
+    """
+    fd, temp_file = tempfile.mkstemp(prefix="legion-brightness-")
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    return temp_file
+
+def install_file(content, target, mode, root=None, source=None):
+    """Install content, or the file at source, root-owned at target
+
+    Under root (dry run) the file is written there directly instead.
+    """
+    if root is not None:
+        path = Path(root) / target.lstrip("/")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content if source is None else Path(source).read_text())
+        os.chmod(path, mode)
+        print(f"✓ Wrote {path}")
+        return True
+
+    temp_file = write_temp(content) if source is None else None
+    try:
+        # install sets owner and mode on the copy itself, with no window in between
+        result = subprocess.run(["sudo", "install", "-o", "root", "-g", "root", "-m", f"{mode:04o}",
+                                 str(source or temp_file), target], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"\nError: Failed to install {target}")
+            print(result.stderr)
+            return False
+        return True
+    finally:
+        if temp_file is not None:
+            os.remove(temp_file)
+
+def run_privileged(cmd, root=None):
+    """Run a command through sudo; in a dry run only print it"""
+    if root is not None:
+        print(f"  would run: sudo {' '.join(cmd)}")
+        return True
+    return subprocess.run(["sudo"] + cmd, capture_output=True).returncode == 0
+
+def install_system_code(names, root=None):
+    """Copy scripts into the root-owned SYSTEM_LIB_DIR
+
+    Anything running as the user can edit the checkout, so root must only
+    run copies it owns.
+    """
+    if not run_privileged(["install", "-d", "-m", "0755", "-o", "root", "-g", "root", SYSTEM_LIB_DIR], root):
+        print(f"\nError: Failed to create {SYSTEM_LIB_DIR}")
+        return False
+    source = Path(__file__).parent
+    for name in names:
+        if not install_file(None, f"{SYSTEM_LIB_DIR}/{name}", 0o644, root, source=source / name):
+            return False
+    return True
+
+def install_helper(root=None):
+    """Install the privileged helper root-owned and enable its service"""
+    print("=" * 60)
+    print("  Legion Brightness - Privileged Helper")
+    print("=" * 60)
+    print()
+    print("This runs brightness_helper.py as a root service so brightness changes")
+    print("need no sudo process. The helper and the module it imports are copied")
+    print(f"to {SYSTEM_LIB_DIR}; run this again after updating the checkout.")
+    print()
+    print(f"User: {USERNAME}")
+    print(f"Target file: {HELPER_UNIT_FILE}")
+    print()
+    
+    if not install_system_code(["brightness_core.py", "brightness_helper.py"], root):
+        return False
+    if not install_file(create_helper_unit_content(), HELPER_UNIT_FILE, 0o644, root):
+        return False
+    run_privileged(["systemctl", "daemon-reload"], root)
+    run_privileged(["systemctl", "enable", "--now", "legion-brightness-helper"], root)
+    
+    print("✓ Helper installed successfully!")
+    print()
+    return True
+
+def install_resume_hook(root=None):
+    """Install the restore command root-owned and the system-sleep hook that runs it"""
+    print("=" * 60)
+    print("  Legion Brightness - Restore After Resume")
+    print("=" * 60)
+    print()
+    print("This writes your saved brightness back after suspend. The hook runs as")
+    print(f"root, so brightness_restore.py and brightness_core.py are copied to")
+    print(f"{SYSTEM_LIB_DIR}; run this again after updating the checkout.")
+    print()
+    print(f"User: {USERNAME}")
+    print(f"Target file: {SLEEP_HOOK_FILE}")
+    print()
+    
+    if not install_system_code(["brightness_core.py", "brightness_restore.py"], root):
+        return False
+    if not install_file(create_sleep_hook_content(), SLEEP_HOOK_FILE, 0o755, root):
+        return False
+    
+    print("✓ Resume hook installed successfully!")
+    print()
+    return True
+
+def install_udev_rule(root=None):
+    """Install the udev rule and add the user to the backlight group"""
+    print("=" * 60)
+    print("  Legion Brightness - Direct Backlight Access")
+    print("=" * 60)
+    print()
+    print(f"This lets members of the '{BACKLIGHT_GROUP}' group write the backlight")
+    print("directly, so brightness changes need no sudo process at all.")
+    print()
+    print(f"User: {USERNAME}")
+    print(f"Target file: {UDEV_RULE_FILE}")
+    print()
+    
+    if not install_file(create_udev_rule_content(), UDEV_RULE_FILE, 0o644, root):
+        return False
+    run_privileged(["usermod", "-aG", BACKLIGHT_GROUP, USERNAME], root)
+    run_privileged(["udevadm", "control", "--reload-rules"], root)
+    run_privileged(["udevadm", "trigger", "--action=add", "--subsystem-match=backlight",
+                    "--subsystem-match=leds"], root)
+    
+    print("✓ udev rule installed successfully!")
+    print()
+    print(f"Log out and back in so your '{BACKLIGHT_GROUP}' group membership takes effect.")
+    print("The applet will then pick direct access automatically.")
+    print()
+    return True
+
+def install_sudoers_rule(root=None):
+    """Install the sudoers rule with password prompt (written under root in a dry run)"""
     print("=" * 60)
     print("  Legion Brightness - Sudoers Setup")
     print("=" * 60)
@@ -59,13 +242,14 @@ def install_sudoers_rule():
     print(f"Target file: {SUDOERS_FILE}")
     print()
     
-    # Create temporary file with sudoers content
-    temp_file = f"/tmp/legion-brightness-sudoers-{os.getpid()}"
+    if root is not None:
+        return install_file(create_sudoers_content(), SUDOERS_FILE, 0o440, root)
+    
+    temp_file = None
     
     try:
-        # Write content to temp file
-        with open(temp_file, 'w') as f:
-            f.write(create_sudoers_content())
+        # Write content to a private temp file
+        temp_file = write_temp(create_sudoers_content())
         
         # Set proper permissions on temp file
         os.chmod(temp_file, 0o440)
@@ -120,13 +304,51 @@ def install_sudoers_rule():
     finally:
         # Clean up temp file
         try:
-            os.remove(temp_file)
+            if temp_file is not None:
+                os.remove(temp_file)
         except:
             pass
 
 def main():
+    parser = argparse.ArgumentParser(description="Set up passwordless Legion Brightness control")
+    parser.add_argument("--udev", action="store_true",
+                        help="also install a udev rule so the applet writes the backlight directly")
+    parser.add_argument("--helper", action="store_true",
+                        help="also install and enable the privileged helper service")
+    parser.add_argument("--resume-hook", action="store_true",
+                        help="also restore the saved brightness after suspend")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="write the files under a temporary root instead of /etc and "
+                             "print privileged commands instead of running them")
+    parser.add_argument("--root", help="root directory for --dry-run (default: a new temporary directory)")
+    args = parser.parse_args()
     print()
     
+    if args.dry_run:
+        root = args.root or tempfile.mkdtemp(prefix="legion-brightness-setup-")
+        print(f"Dry run: installing under {root}")
+        print()
+        ok = install_sudoers_rule(root)
+        if ok and args.udev:
+            ok = install_udev_rule(root)
+        if ok and args.helper:
+            ok = install_helper(root)
+        if ok and args.resume_hook:
+            ok = install_resume_hook(root)
+        return 0 if ok else 1
+    
+    if args.helper and not install_helper():
+        return 1
+    if args.resume_hook and not install_resume_hook():
+        return 1
+    
+    if args.udev:
+        if test_sysfs_access():
+            print("✓ The backlight is already writable without sudo. No action needed!")
+            print()
+        elif not install_udev_rule():
+            return 1
+    
     # Check if already configured
     if test_sudo_access():
         print("=" * 60)